@@ -0,0 +1,56 @@
+"""
+    Memory benchmark: list of words vs WordStore.
+
+    Usage: python bench_wordstore.py [words_num ...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "verbo"))
+
+from wordstore import WordStore
+import corpus
+
+SIZES = (100000, 1000000)
+
+
+def list_size(words):
+    return sys.getsizeof(words) + sum([sys.getsizeof(w) for w in words])
+
+
+def store_size(store):
+    # words with flags, sentence and paragraph starts
+    return sys.getsizeof(store) + store.memory_size()
+
+
+def build(words, words_num):
+    """ Tokenize like Reader.iter_txt, returns build time """
+    start = time.time()
+    for line in corpus.lines(words_num):
+        for w in line.split():
+            words.append(w)
+    return time.time() - start
+
+
+def main(sizes):
+    print("%10s %12s %12s %8s %10s %10s" % ("words", "list, KB", "store, KB",
+                                             "ratio", "list, s", "store, s"))
+    for words_num in sizes:
+        words = []
+        list_time = build(words, words_num)
+        list_kb = list_size(words) / 1024.
+        del words
+
+        store = WordStore()
+        store_time = build(store, words_num)
+        store_kb = store_size(store) / 1024.
+
+        print("%10d %12.0f %12.0f %8.1f %10.2f %10.2f" % (
+            words_num, list_kb, store_kb, list_kb / store_kb,
+            list_time, store_time))
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or SIZES)
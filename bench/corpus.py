@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+    Synthetic books for benchmarks.
+"""
+
+import os
+import base64
+import random
+
+VOCABULARY = (u"the of and to in a is that for it as was with be by on not "
+              u"he this are or his from at which but have an they you were "
+              u"reading attention perception remarkable extraordinarily "
+              u"слово книга "
+              u"читать").split()
+PUNCT = (u"", u"", u"", u"", u"", u"", u",", u".", u"!", u"?", u":")
+WORDS_PER_LINE = 12
+
+
+def lines(words_num, seed=0):
+    """ Yields lines of text with words_num words in total """
+    rnd = random.Random(seed)
+    line = []
+    for i in xrange(words_num):
+        line.append(rnd.choice(VOCABULARY) + rnd.choice(PUNCT))
+        if len(line) == WORDS_PER_LINE:
+            yield u" ".join(line) + u"\n"
+            line = []
+    if line:
+        yield u" ".join(line) + u"\n"
+
+
+PARAS_PER_SECTION = 40
+IMAGE_SIZE = 30000
+LINES_PER_PARA = 5
+
+
+def paragraphs(words_num, seed=0):
+    """ Yields paragraphs (lists of lines) with words_num words in total """
+    para = []
+    for line in lines(words_num, seed):
+        para.append(line)
+        if len(para) == LINES_PER_PARA:
+            yield para
+            para = []
+    if para:
+        yield para
+
+
+def write_txt(path, words_num, seed=0):
+    book = open(path, "wb")
+    for para in paragraphs(words_num, seed):
+        for line in para:
+            book.write(line.encode("utf-8"))
+        book.write("\n")
+    book.close()
+
+
+def xml_escape(text):
+    return text.replace(u"&", u"&amp;").replace(u"<", u"&lt;")
+
+
+def write_binaries(write, images, seed=0):
+    """ Base64 "images" of IMAGE_SIZE bytes, one per section """
+    rnd = random.Random(seed)
+    for i in xrange(images):
+        data = "".join([chr(rnd.randint(0, 255))
+                        for j in xrange(IMAGE_SIZE)])
+        write(u'<binary id="img%d.jpg" content-type="image/jpeg">' % i)
+        write(base64.encodestring(data).decode("ascii"))
+        write(u"</binary>\n")
+
+
+def write_fb2(path, words_num, seed=0, images=False):
+    book = open(path, "wb")
+
+    def write(text):
+        book.write(text.encode("utf-8"))
+
+    write(u'<?xml version="1.0" encoding="utf-8"?>\n'
+          u'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0" '
+          u'xmlns:l="http://www.w3.org/1999/xlink">\n'
+          u'<description><title-info><genre>prose</genre>'
+          u'<author><first-name>Synthetic</first-name>'
+          u'<last-name>Author</last-name></author>'
+          u'<book-title>Synthetic book %d</book-title>'
+          u'<annotation><p>Generated for benchmarks.</p></annotation>'
+          u'<lang>en</lang></title-info></description>\n<body>\n' % words_num)
+
+    section = 0
+    for i, para in enumerate(paragraphs(words_num, seed)):
+        if i % PARAS_PER_SECTION == 0:
+            if section:
+                write(u"</section>\n")
+            section += 1
+            write(u"<section><title><p>Chapter %d</p></title>\n" % section)
+        write(u"<p>%s</p>\n" % xml_escape(u"".join(para)))
+    if section:
+        write(u"</section>\n")
+
+    write(u"</body>\n")
+    if images:
+        write_binaries(write, section, seed)
+    write(u"</FictionBook>\n")
+    book.close()
+
+
+def book_path(directory, words_num, ext, images=False):
+    """ Returns path of synthetic book, creating it if needed.
+        With images fb2 book has a binary image for every section.
+    """
+    name = "book_%d" % words_num
+    if images:
+        name += "_img"
+    path = os.path.join(directory, "%s.%s" % (name, ext))
+    if not os.path.exists(path):
+        if ext == "txt":
+            write_txt(path, words_num)
+        else:
+            write_fb2(path, words_num, images=images)
+    return path
@@ -0,0 +1,594 @@
+"""
+    Benchmarks of Verbo hot paths on synthetic books.
+    Runs under desktop Python 2 with headless backend.
+
+    Usage:
+        python run_bench.py [--sizes 10000,100000] [--only parse,render]
+                            [--json result.json] [--compare base.json]
+"""
+
+import os
+import sys
+import time
+import marshal
+import tempfile
+import optparse
+
+try:
+    import json
+except ImportError:
+    json = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from verbo import backend
+backend.use(backend.HEADLESS)
+
+from verbo.reader import Reader
+from verbo.fb2parser import FB2Parser, FB2MetaParser
+from verbo.libmgr import LibManager
+from verbo.wordstore import WordStore
+from verbo.wordmeta import best_letter_pos, WordMeta, DELAY_UNIT
+from verbo.wordmeta import FixedTiming, AdaptiveTiming
+from verbo.fontmetrics import GlyphWidths
+from verbo.bookindex import BookIndex, ResumedWords, remove_index
+import corpus
+
+SIZES = (10000, 100000, 1000000, 5000000)
+GROUPS = ("parse", "render", "library")
+CORPUS_DIR = os.path.join(tempfile.gettempdir(), "verbo-bench")
+RENDER_BOOK_SIZE = 100000
+RENDER_FRAMES = 5000
+LIBRARY_BOOKS = 1000
+
+
+def peak_kb():
+    """ Peak resident memory of the process in KB """
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def isolated(func, *args):
+    """ Run func in a child process, so peak memory is measured only
+        for it. Returns func result (dict) with "peak_kb" added.
+    """
+    if not hasattr(os, "fork"):
+        result = func(*args)
+        result["peak_kb"] = peak_kb()
+        return result
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        base_kb = peak_kb()
+        result = func(*args)
+        result["peak_kb"] = peak_kb() - base_kb
+        os.write(write_fd, marshal.dumps(result))
+        os._exit(0)
+
+    os.close(write_fd)
+    data = []
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        data.append(chunk)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return marshal.loads("".join(data))
+
+
+def frame_stats(times):
+    times.sort()
+    return {"frame_us_mean": sum(times) / len(times) * 1e6,
+            "frame_us_p95": times[int(len(times) * 0.95)] * 1e6,
+            "frames": len(times)}
+
+
+def pixel_stats(draw, frames):
+    """ Pixels touched per frame by drawing into image and by blits
+        to canvas and measure_text() calls, headless backend counts them.
+    """
+    img_pixels = draw.img.pixels
+    canvas_pixels = draw.canvas.pixels
+    measures = draw.canvas.measures
+    draw.img.pixels = draw.canvas.pixels = draw.canvas.measures = 0
+    return {"draw_px": float(img_pixels) / frames,
+            "blit_px": float(canvas_pixels) / frames,
+            "measures": float(measures) / frames}
+
+
+def parse_txt(path):
+    """ Loading of not indexed txt book like the reader does it:
+        tokenizing, word meta, chunks and writing of index
+    """
+    remove_index(path)
+    reader = Reader(lambda: True, u"bench", path, 0)
+    start = time.time()
+    reader.finish_loading()
+    reader.save_index()
+    elapsed = time.time() - start
+    words = len(reader.words)
+    reader.close_reader()
+    return {"words": words,
+            "words_per_sec": words / elapsed,
+            "mb_per_sec": os.path.getsize(path) / elapsed / 2**20}
+
+
+def parse_fb2(path):
+    start = time.time()
+    words = FB2Parser(path).parse_words()
+    elapsed = time.time() - start
+    return {"words": len(words),
+            "words_per_sec": len(words) / elapsed,
+            "mb_per_sec": os.path.getsize(path) / elapsed / 2**20}
+
+
+def fb2_meta(path):
+    count = 100
+    start = time.time()
+    for i in xrange(count):
+        FB2MetaParser(path).parse_meta()
+    return {"ops": count, "ops_per_sec": count / (time.time() - start)}
+
+
+def open_reader(path):
+    """ Reader of completely loaded book """
+    reader = Reader(lambda: True, u"bench", path, 0)
+    reader.finish_loading()
+    reader.save_index()
+    return reader
+
+
+def first_word(path, last_pos=0):
+    """ Time from opening not indexed book to its first frame """
+    remove_index(path)
+    start = time.time()
+    reader = Reader(lambda: True, u"bench", path, last_pos)
+    elapsed = time.time() - start
+    reader.close_reader()
+    return {"first_word_ms": elapsed * 1000}
+
+
+def resumed_first_word(path, last_pos):
+    """ Time to the first frame of book closed at last_pos before it
+        was loaded, loading is resumed from its partial index
+    """
+    remove_index(path)
+    reader = Reader(lambda: True, u"bench", path, 0)
+    reader.load_timer.cancel()
+    reader.load_words(last_pos)
+    reader.close_reader()
+    start = time.time()
+    reader = Reader(lambda: True, u"bench", path, last_pos)
+    elapsed = time.time() - start
+    resumed = isinstance(reader.words, ResumedWords)
+    reader.close_reader()
+    return {"first_word_ms": elapsed * 1000, "resumed": int(resumed)}
+
+
+def background_loading(path):
+    """ Loading steps of not indexed book while it is read, the longest
+        one delays a frame. The rest of index is written on pause.
+    """
+    remove_index(path)
+    reader = Reader(lambda: True, u"bench", path, 0)
+    reader.load_timer.cancel()
+    reader.pause = False
+    steps = []
+    while reader.loader is not None:
+        start = time.time()
+        reader.load_step()
+        steps.append(time.time() - start)
+        reader.load_timer.cancel()
+    start = time.time()
+    reader.reader_pause()
+    pause = time.time() - start
+    indexed = isinstance(reader.words, BookIndex)
+    reader.close_reader()
+    return {"steps": len(steps),
+            "step_ms_mean": sum(steps) / len(steps) * 1000,
+            "step_ms_max": max(steps) * 1000,
+            "pause_ms": pause * 1000,
+            "indexed": int(indexed)}
+
+
+def display_scene(path):
+    reader = open_reader(path)
+    pixel_stats(reader.draw, 1)
+    times = []
+    for i in xrange(RENDER_FRAMES):
+        reader.currword_idx = i % reader.words_num
+        start = time.time()
+        reader.display_scene()
+        times.append(time.time() - start)
+    result = frame_stats(times)
+    result.update(pixel_stats(reader.draw, len(times)))
+    reader.close_reader()
+    return result
+
+
+def draw_word(path):
+    reader = open_reader(path)
+    draw = reader.draw
+    frames = [(reader.words[i], best_letter_pos(reader.words[i]))
+              for i in xrange(min(RENDER_FRAMES, len(reader.words)))]
+    pixel_stats(draw, 1)
+    times = []
+    for word, focus in frames:
+        start = time.time()
+        draw.erase()
+        draw.word(word, focus)
+        draw.update()
+        times.append(time.time() - start)
+    result = frame_stats(times)
+    result.update(pixel_stats(draw, len(times)))
+    reader.close_reader()
+    return result
+
+
+# shaped scripts are measured as whole words, characters beyond
+# 0xffff are in cache file too
+COMPLEX_WORDS = (u"\u05e9\u05b8\u05c1\u05dc\u05d5\u05b9\u05dd",
+                 u"\u0928\u092e\u0938\u094d\u0924\u0947",
+                 u"cafe\u0301",
+                 u"ok\U0001f600")
+
+
+# pairs of letters kerned by 1 px in non-additive metrics
+KERN_PAIRS = (u"th", u"he", u"an", u"in", u"er", u"re", u"ea")
+
+
+def kerned_metrics(measure):
+    """ Font with kerning pairs """
+    def measure_text(text, font):
+        bounds, advance, chars = measure(text, font)
+        for i in xrange(len(text) - 1):
+            if text[i:i+2] in KERN_PAIRS:
+                advance -= 1
+        return bounds, advance, chars
+    return measure_text
+
+
+def fractional_metrics(measure):
+    """ Outline font with fractional advances, width of text is rounded
+        once, so it's not a sum of rounded advances
+    """
+    def measure_text(text, font):
+        bounds, advance, chars = measure(text, font)
+        return bounds, int(advance * 0.9 + 0.5), chars
+    return measure_text
+
+
+def glyph_widths(path, metrics=None):
+    """ Widths of word parts drawn by frame, from glyph table and by
+        direct measure_text() calls. metrics makes measure_text() of
+        headless canvas non-additive, font should be detected as kerned
+        then and measured directly.
+    """
+    reader = open_reader(path)
+    canvas = reader.draw.canvas
+    font = reader.draw.WORD_FONT
+    measure = canvas.measure_text
+    if metrics is not None:
+        measure = metrics(measure)
+    parts = []
+    for i in xrange(min(RENDER_FRAMES, len(reader.words))):
+        word = reader.words[i]
+        focus = best_letter_pos(word)
+        parts.extend([word[:focus], word[focus], word[focus+1:]])
+    parts.extend(COMPLEX_WORDS)
+    reader.close_reader()
+
+    start = time.time()
+    direct = [measure(part, font)[1] for part in parts]
+    direct_time = time.time() - start
+
+    glyphs = GlyphWidths(measure, font)
+    canvas.measures = 0
+    start = time.time()
+    table = [glyphs.width(part) for part in parts]
+    table_time = time.time() - start
+
+    # widths are the same after saving and loading cache
+    glyphs.path = os.path.join(CORPUS_DIR, "bench.vbg")
+    loaded = GlyphWidths(measure, font, glyphs.path)
+    cached = glyphs.save() and loaded.load() and \
+        loaded.widths == glyphs.widths
+
+    errors = [abs(a - b) for a, b in zip(direct, table)]
+    return {"direct_us": direct_time / len(parts) * 1e6,
+            "table_us": table_time / len(parts) * 1e6,
+            "measures": canvas.measures,
+            "texts": len(parts),
+            "max_error_px": max(errors),
+            "mean_error_px": float(sum(errors)) / len(errors),
+            "kerned": int(glyphs.kerned),
+            "cached": int(cached)}
+
+
+def reading_loop(path, chunks=False, paged=False):
+    """ Reading from start to the end, sleeps are free with simulated
+        clock, so it's the cost of the loop itself. show_us is time
+        of showing a word after sleep, it's the jitter of word timing.
+    """
+    reader = open_reader(path)
+    if paged:
+        # words are paged from index like on device without mmap
+        reader.words.close()
+        reader.words = BookIndex(path, True)
+        reader.set_frames()
+    if chunks:
+        reader.toggle_chunks()
+    frames = min(RENDER_FRAMES * 4, len(reader.frames))
+    show_times = []
+    display_scene = reader.display_scene
+
+    def timed_display():
+        show_start = time.time()
+        display_scene()
+        show_times.append(time.time() - show_start)
+        if len(show_times) == frames:
+            reader.pause = True
+    reader.display_scene = timed_display
+
+    start = time.time()
+    reader.reader_start()
+    elapsed = time.time() - start
+    words = reader.currword_idx
+    result = {}
+    if paged:
+        result["words_kb"] = reader.words.memory_size() / 1024.
+        result["index_kb"] = reader.words.file_size / 1024.
+        result["page_reads"] = reader.words.page_reads
+    reader.close_reader()
+    show = frame_stats(show_times)
+    result.update({"frames": frames, "frame_us_mean": elapsed / frames * 1e6,
+                   "show_us_mean": show["frame_us_mean"],
+                   "show_us_p95": show["frame_us_p95"],
+                   "words_per_frame": float(words) / frames})
+    return result
+
+
+def chunk_frames(path):
+    """ Frame length of chunks at MAX_CHUNK_WPM and of single words at
+        MAX_WPM, the shortest chunk frame shouldn't be shorter than the
+        shortest word frame (min_ok).
+    """
+    reader = open_reader(path)
+    result = {}
+    for name, wpm in (("word", Reader.MAX_WPM),
+                      ("chunk", Reader.MAX_CHUNK_WPM)):
+        reader.wpm = wpm
+        reader.init_delay()
+        frames = reader.frames
+        delays = [frames.delay[i] * reader.word_unit
+                  for i in xrange(frames.ready())]
+        result[name + "_frame_ms"] = sum(delays) / len(delays) * 1000
+        result[name + "_frame_ms_min"] = min(delays) * 1000
+        reader.toggle_chunks()
+    reader.close_reader()
+    result["min_ok"] = int(result["chunk_frame_ms_min"] >=
+                           result["word_frame_ms_min"])
+    return result
+
+
+def timing_model(path, timing):
+    """ Cost of computing word data with timing model and mean delays
+        (in word delays) of short, long and all words.
+    """
+    words = WordStore()
+    for line in open(path).read().decode("utf-8").splitlines():
+        words.extend(line.split())
+    meta = WordMeta(timing)
+    start = time.time()
+    meta.update(words)
+    elapsed = time.time() - start
+
+    result = {"meta_us": elapsed / len(words) * 1e6}
+    groups = (("all", 0, 1000), ("short", 0, 3), ("long", 9, 1000))
+    for name, min_len, max_len in groups:
+        delays = [meta.delay[i] for i in xrange(len(words))
+                  if min_len <= len(words[i]) - meta.pause[i] <= max_len]
+        result[name + "_delay"] = sum(delays) / DELAY_UNIT / len(delays)
+    return result
+
+
+def ops_per_sec(lib, func, count):
+    """ Changes are counted only when they reach db """
+    syncs = lib.db.syncs
+    written = lib.db.written
+    start = time.time()
+    func()
+    lib.flush()
+    return {"ops": count,
+            "ops_per_sec": count / (time.time() - start),
+            "syncs": lib.db.syncs - syncs,
+            "written_per_op": (lib.db.written - written) / count}
+
+
+def library(name):
+    lib = LibManager(u"bench-%s.e32dbm" % name)
+    paths = [u"E:\\books\\book_%05d.fb2" % i for i in xrange(LIBRARY_BOOKS)]
+    return lib, paths
+
+
+def lib_add_book():
+    lib, paths = library("add")
+
+    def run():
+        for i, path in enumerate(paths):
+            lib.add_book(u"Book %d" % i, path)
+    return ops_per_sec(lib, run, len(paths))
+
+
+def lib_update_book():
+    lib, paths = library("update")
+    for i, path in enumerate(paths):
+        lib.add_book(u"Book %d" % i, path)
+    lib.flush()
+
+    def run():
+        for i, path in enumerate(paths):
+            lib.update_book(path, u"Book %d" % i, i)
+    return ops_per_sec(lib, run, len(paths))
+
+
+def lib_close_book():
+    """ Save of position and flush on every reader close """
+    lib, paths = library("close")
+    for i, path in enumerate(paths):
+        lib.add_book(u"Book %d" % i, path)
+    lib.flush()
+    count = 100
+
+    def run():
+        for i in xrange(count):
+            book = i * 7 % LIBRARY_BOOKS
+            lib.update_book(paths[book], u"Book %d" % book, i)
+            lib.flush()
+    return ops_per_sec(lib, run, count)
+
+
+def lib_update_batch():
+    lib, paths = library("batch")
+    for i, path in enumerate(paths):
+        lib.add_book(u"Book %d" % i, path)
+    lib.flush()
+
+    def run():
+        lib.begin()
+        for i, path in enumerate(paths):
+            lib.update_book(path, u"Book %d" % i, i)
+        lib.commit()
+    return ops_per_sec(lib, run, len(paths))
+
+
+def lib_get_books():
+    lib, paths = library("get")
+    for i, path in enumerate(paths):
+        lib.add_book(u"Book %d" % i, path)
+    lib.flush()
+    count = 100
+
+    def run():
+        for i in xrange(count):
+            lib.get_books()
+    return ops_per_sec(lib, run, count)
+
+
+def lib_get_page():
+    lib, paths = library("page")
+    for i, path in enumerate(paths):
+        lib.add_book(u"Book %d" % i, path)
+    lib.flush()
+    count = 100
+
+    def run():
+        for i in xrange(count):
+            lib.get_books(i * 10 % LIBRARY_BOOKS, 30)
+    return ops_per_sec(lib, run, count)
+
+
+def run_benchmarks(sizes, groups):
+    if not os.path.isdir(CORPUS_DIR):
+        os.makedirs(CORPUS_DIR)
+    results = {}
+
+    def run(name, func, *args):
+        sys.stderr.write("%s...\n" % name)
+        results[name] = func(*args)
+
+    if "parse" in groups:
+        for size in sizes:
+            run("parse_txt_%d" % size, isolated, parse_txt,
+                corpus.book_path(CORPUS_DIR, size, "txt"))
+            run("parse_fb2_%d" % size, isolated, parse_fb2,
+                corpus.book_path(CORPUS_DIR, size, "fb2"))
+            run("parse_fb2_img_%d" % size, isolated, parse_fb2,
+                corpus.book_path(CORPUS_DIR, size, "fb2", images=True))
+            run("fb2_meta_%d" % size, fb2_meta,
+                corpus.book_path(CORPUS_DIR, size, "fb2"))
+            run("first_word_txt_%d" % size, first_word,
+                corpus.book_path(CORPUS_DIR, size, "txt"))
+            # book closed in the middle, without and with partial index
+            run("first_word_mid_txt_%d" % size, first_word,
+                corpus.book_path(CORPUS_DIR, size, "txt"), size // 2)
+            run("first_word_resumed_txt_%d" % size, resumed_first_word,
+                corpus.book_path(CORPUS_DIR, size, "txt"), size // 2)
+            run("loading_txt_%d" % size, background_loading,
+                corpus.book_path(CORPUS_DIR, size, "txt"))
+
+    if "render" in groups:
+        path = corpus.book_path(CORPUS_DIR, RENDER_BOOK_SIZE, "txt")
+        run("display_scene", display_scene, path)
+        run("draw_word", draw_word, path)
+        run("glyph_widths", glyph_widths, path)
+        run("glyph_widths_kerned", glyph_widths, path, kerned_metrics)
+        run("glyph_widths_fractional", glyph_widths, path,
+            fractional_metrics)
+        run("reading_loop", reading_loop, path)
+        run("reading_chunks", reading_loop, path, True)
+        run("reading_paged", reading_loop, path, False, True)
+        run("chunk_frames", chunk_frames, path)
+        run("timing_fixed", timing_model, path, FixedTiming())
+        run("timing_adaptive", timing_model, path, AdaptiveTiming())
+
+    if "library" in groups:
+        run("lib_add_book", lib_add_book)
+        run("lib_update_book", lib_update_book)
+        run("lib_close_book", lib_close_book)
+        run("lib_update_batch", lib_update_batch)
+        run("lib_get_books", lib_get_books)
+        run("lib_get_page", lib_get_page)
+
+    return results
+
+
+def print_results(results, base=None):
+    for name in sorted(results.keys()):
+        metrics = results[name]
+        line = ["%-22s" % name]
+        for key in sorted(metrics.keys()):
+            value = metrics[key]
+            item = "%s=%.1f" % (key, value)
+            if base and name in base and key in base[name] and base[name][key]:
+                item += " (%+.1f%%)" % ((value / float(base[name][key]) - 1) * 100)
+            line.append(item)
+        print("  ".join(line))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--sizes", default=",".join([str(s) for s in SIZES]),
+                      help="comma separated corpus sizes in words")
+    parser.add_option("--only", default=",".join(GROUPS),
+                      help="comma separated groups: %s" % ", ".join(GROUPS))
+    parser.add_option("--json", help="save results into JSON file")
+    parser.add_option("--compare", help="compare with results from JSON file")
+    options, args = parser.parse_args()
+
+    sizes = [int(s) for s in options.sizes.split(",")]
+    results = run_benchmarks(sizes, options.only.split(","))
+
+    base = None
+    if options.compare:
+        base = json.load(open(options.compare))["results"]
+    print_results(results, base)
+
+    if options.json:
+        out = open(options.json, "w")
+        json.dump({"python": sys.version.split()[0], "results": results},
+                  out, indent=1, sort_keys=True)
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+    Platform backend.
+
+    On device Verbo uses PyS60 modules e32, appuifw, graphics, key_codes
+    and e32dbm. Off device they are replaced by the in-memory headless
+    implementation (verbo/headless), so the application runs unchanged
+    under desktop Python for profiling and benchmarks:
+
+        from verbo import backend
+        backend.use(backend.HEADLESS)
+        from verbo import verboapp
+"""
+
+import sys
+import time
+
+NATIVE = "native"
+HEADLESS = "headless"
+
+name = None
+# time source for frame scheduling
+clock = time.time
+
+
+def use(backend_name=None):
+    """ Select backend. By default native is used if it is available. """
+    global name, clock
+
+    if backend_name is None:
+        try:
+            import e32
+            backend_name = NATIVE
+        except ImportError:
+            backend_name = HEADLESS
+
+    if backend_name == HEADLESS:
+        from headless import e32, appuifw, graphics, key_codes, e32dbm
+        from headless.simclock import clock as sim_clock
+        sys.modules.update({"e32": e32,
+                            "appuifw": appuifw,
+                            "graphics": graphics,
+                            "key_codes": key_codes,
+                            "e32dbm": e32dbm})
+        clock = sim_clock.now
+    elif backend_name == NATIVE:
+        clock = time.time
+    else:
+        raise ValueError("unknown backend: %s" % backend_name)
+
+    name = backend_name
@@ -0,0 +1,737 @@
+"""
+    Sidecar word index of a book.
+
+    Parsed words are saved next to the book (book path + INDEX_EXT),
+    so next time the book is opened without parsing. Index is written
+    while the book is tokenized (IndexWriter): words go in blocks of
+    PAGE_WORDS words as soon as they are complete, tables and header
+    when the book is loaded. Book closed before it is loaded keeps
+    partial index of its complete blocks, loading is resumed after
+    them (ResumedWords).
+
+    File layout (all numbers are little-endian):
+        header      HEADER_FMT: magic, version, partial flag, book size,
+                    book mtime, id of timing model of meta, words number,
+                    path size, tables offset, chapters number, chapter
+                    titles size, sentences number, paragraphs number,
+                    chunks number, byte offset of the line of the first
+                    word after partial index and words before it in line
+        path        utf-8 book path
+        blocks      every block of PAGE_WORDS words (the last one can be
+                    shorter) has (words + 1) uint32 byte offsets of words
+                    in block text, bytes of flags, focus letter, pause
+                    class and delay of every word (WordMeta), (words + 1)
+                    uint32 prefix sums of delays and utf-8 words without
+                    separators
+        offsets     (blocks + 1) uint32 file offsets of blocks and of
+                    the end of the last block, tables start here
+        chapters    uint32 start word of every chapter, byte of level
+                    for every chapter, utf-8 titles separated by "\n"
+        sentences   uint32 start words of sentences
+        paragraphs  uint32 start words of paragraphs
+        chunks      uint32 start words of chunks, focus letter and delay
+                    bytes of every chunk (ChunkIndex)
+"""
+
+import os
+import sys
+import struct
+import bisect
+from array import array
+
+try:
+    import mmap
+except ImportError:
+    # no mmap on device, words are read from index by pages
+    mmap = None
+
+from wordstore import WordStore, OFFSET_TYPE
+from chapters import ChapterIndex
+import wordmeta
+from wordmeta import WordMeta
+from chunks import ChunkIndex
+
+INDEX_EXT = ".vbi"
+MAGIC = "VBIX"
+VERSION = 11
+HEADER_FMT = "<4sHH13I"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+OFFSET_SIZE = 4
+# words in one block of index, it's a page of paged index
+PAGE_WORDS = 1024
+# pages kept in memory, least recently used page is dropped
+MAX_PAGES = 8
+# next page is read when reading gets this close to it
+PREFETCH_WORDS = 256
+# numbers in one page of tables (chunks, sentences, paragraphs)
+PAGE_ITEMS = 1024
+# pages of every table kept in memory
+MAX_TABLE_PAGES = 2
+# arrays of word page
+OFFSETS, FLAGS, FOCUS, PAUSE, DELAY, SUMS, TEXT = range(7)
+
+
+def index_path(book_path):
+    return book_path + INDEX_EXT
+
+
+def book_key(book_path):
+    """ Returns (size, mtime) of the book, index is valid only for them """
+    st = os.stat(book_path)
+    return st.st_size, int(st.st_mtime)
+
+
+def _to_le(arr):
+    if sys.byteorder == "big":
+        # array may be in use, its copy is swapped
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tostring()
+
+
+def write_uints(index_file, numbers):
+    """ Write array of numbers as uint32 """
+    if numbers.itemsize == OFFSET_SIZE:
+        index_file.write(_to_le(numbers))
+    else:
+        for number in numbers:
+            index_file.write(struct.pack("<I", number))
+
+
+def read_uints(data, start, count):
+    numbers = array(OFFSET_TYPE)
+    if numbers.itemsize == OFFSET_SIZE:
+        numbers.fromstring(data[start:start + count * OFFSET_SIZE])
+        if sys.byteorder == "big":
+            numbers.byteswap()
+    else:
+        numbers.extend(struct.unpack("<%dI" % count,
+                                     data[start:start + count * OFFSET_SIZE]))
+    return numbers
+
+
+def create_writer(book_path):
+    """ Returns IndexWriter or None if index can't be written """
+    try:
+        return IndexWriter(book_path)
+    except EnvironmentError:
+        return None
+
+
+def remove_index(book_path):
+    try:
+        os.remove(index_path(book_path))
+    except OSError:
+        pass
+
+
+def open_index(book_path, partial=False):
+    """ Returns BookIndex if a valid index exists for the book,
+        otherwise None. With partial it's partial index of the book
+        which wasn't loaded, it is opened for writing to continue it.
+    """
+    try:
+        if partial:
+            # pages are read from the file which writer shares
+            index = BookIndex(book_path, True, True)
+        else:
+            index = BookIndex(book_path)
+    except (EnvironmentError, ValueError, struct.error):
+        return None
+
+    if not index.is_valid() or index.partial != partial:
+        index.close()
+        return None
+
+    return index
+
+
+def resume_writer(index):
+    """ Returns IndexWriter which continues partial index or None """
+    try:
+        return IndexWriter(index.book_path, index)
+    except EnvironmentError:
+        return None
+
+
+class IndexWriter(object):
+    """ Writes index of the book while it is tokenized. Words with
+        final flags and meta are written by blocks, the last block,
+        tables and header by finish(). Index without header is invalid.
+        Book closed before it is loaded gets partial index by suspend(),
+        writer of the resumed loading continues it (partial).
+    """
+
+    def __init__(self, book_path, partial=None):
+        self.book_path = book_path
+        self.book_size, self.book_mtime = book_key(book_path)
+        self.path = book_path.encode("utf-8")
+        # file offsets of blocks
+        self.blocks = array(OFFSET_TYPE)
+        self.words_num = 0
+        # words of partial index are still read from its file,
+        # so the writer shares the file with it
+        self.partial = partial
+        if partial is None:
+            self.index_file = open(index_path(book_path), "wb")
+            # the end of the last block
+            self.end = HEADER_SIZE + len(self.path)
+        else:
+            self.index_file = partial.index_file
+            self.blocks.extend(partial.blocks[:-1])
+            self.words_num = partial.words_num
+            # tables of partial index are overwritten by next blocks
+            self.end = partial.blocks[-1]
+        try:
+            self.index_file.seek(0)
+            self.index_file.write("\0" * HEADER_SIZE)
+            if partial is None:
+                self.index_file.write(self.path)
+        except EnvironmentError:
+            self.abort()
+            raise
+
+    def write_words(self, words, end):
+        """ Write blocks of words before end, returns False on error """
+        try:
+            while self.words_num + PAGE_WORDS <= end:
+                self.write_block(words, self.words_num + PAGE_WORDS)
+        except EnvironmentError:
+            self.abort()
+            return False
+        return True
+
+    def write_block(self, words, end):
+        start = self.words_num
+        index_file = self.index_file
+        index_file.seek(self.end)
+        self.blocks.append(self.end)
+        offsets = array(OFFSET_TYPE, [0])
+        text = []
+        text_size = 0
+        for idx in xrange(start, end):
+            data = words[idx].encode("utf-8")
+            text.append(data)
+            text_size += len(data)
+            offsets.append(text_size)
+
+        meta = words.meta
+        write_uints(index_file, offsets)
+        index_file.write(words.flags[start:end].tostring())
+        index_file.write(meta.focus[start:end].tostring())
+        index_file.write(meta.pause[start:end].tostring())
+        index_file.write(meta.delay[start:end].tostring())
+        write_uints(index_file, meta.sums[start:end+1])
+        index_file.write("".join(text))
+        self.end = index_file.tell()
+        self.words_num = end
+
+    def finish(self, words):
+        """ Write the rest of words, tables and header of completely
+            loaded book. Returns False if index can't be written.
+        """
+        try:
+            words_num = len(words)
+            while self.words_num < words_num or not self.blocks:
+                self.write_block(words, min(self.words_num + PAGE_WORDS,
+                                            words_num))
+            self.write_tables(words, words.sentences, words.paragraphs,
+                              len(words.chunks), (0, 0, 0))
+        except EnvironmentError:
+            self.abort()
+            return False
+        return True
+
+    def suspend(self, words, resume):
+        """ Write tables and header of words in the written blocks of
+            book which isn't loaded, resume is (offset, skip) of the
+            first word after them, see ResumedWords. Returns False if
+            index can't be written.
+        """
+        words_num = self.words_num
+        sentences = words.sentences
+        paragraphs = words.paragraphs
+        # chunk which can get more words is made again after resume
+        chunks_num = bisect.bisect_right(words.chunks.starts, words_num)
+        try:
+            self.write_tables(
+                words,
+                sentences[:bisect.bisect_right(sentences, words_num)],
+                paragraphs[:bisect.bisect_right(paragraphs, words_num)],
+                chunks_num, (1,) + tuple(resume))
+        except EnvironmentError:
+            self.abort()
+            return False
+        return True
+
+    def write_tables(self, words, sentences, paragraphs, chunks_num,
+                     resume):
+        """ Write tables after the last block and header, resume is
+            (partial flag, offset, skip)
+        """
+        index_file = self.index_file
+        index_file.seek(self.end)
+        tables_base = self.end
+        write_uints(index_file, self.blocks)
+        write_uints(index_file, array(OFFSET_TYPE, [tables_base]))
+        chapters = words.chapters or ChapterIndex()
+        titles = u"\n".join(chapters.titles).encode("utf-8")
+        write_uints(index_file, chapters.starts)
+        index_file.write(chapters.levels.tostring())
+        index_file.write(titles)
+        write_uints(index_file, sentences)
+        write_uints(index_file, paragraphs)
+        chunks = words.chunks
+        write_uints(index_file, chunks.starts[:chunks_num])
+        index_file.write(chunks.focus[:chunks_num].tostring())
+        index_file.write(chunks.delay[:chunks_num].tostring())
+        # tables of continued partial index could be longer
+        index_file.truncate()
+
+        partial, offset, skip = resume
+        index_file.seek(0)
+        index_file.write(struct.pack(HEADER_FMT, MAGIC, VERSION, partial,
+                                     self.book_size, self.book_mtime,
+                                     words.meta.timing.model_id(),
+                                     self.words_num, len(self.path),
+                                     tables_base, len(chapters),
+                                     len(titles), len(sentences),
+                                     len(paragraphs), chunks_num,
+                                     offset, skip))
+        if self.partial is None:
+            index_file.close()
+        else:
+            index_file.flush()
+
+    def abort(self):
+        """ Remove partially written index """
+        if self.partial is not None:
+            # words are read from blocks until the book is closed,
+            # index without header is just written again next time
+            return
+        self.index_file.close()
+        remove_index(self.book_path)
+
+
+class PagedArray(object):
+    """ Sorted array of numbers (chunk, sentence or paragraph starts)
+        or bytes read from index by pages of PAGE_ITEMS items. Binary
+        search finds the page by its first number, they are read once.
+    """
+
+    def __init__(self, index, base, length, typecode=OFFSET_TYPE):
+        self.index = index
+        self.base = base
+        self.length = length
+        self.typecode = typecode
+        self.itemsize = typecode == "B" and 1 or OFFSET_SIZE
+        self.pages_num = (length + PAGE_ITEMS - 1) // PAGE_ITEMS
+        self.pages = {}
+        self.pages_lru = []
+        # page number -> its first number
+        self.firsts = {}
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.length
+        if idx < 0 or idx >= self.length:
+            raise IndexError("array index out of range")
+        return self.page(idx // PAGE_ITEMS)[idx % PAGE_ITEMS]
+
+    def page(self, num):
+        page = self.pages.get(num)
+        if page is not None:
+            if self.pages_lru[-1] != num:
+                self.pages_lru.remove(num)
+                self.pages_lru.append(num)
+            return page
+
+        first = num * PAGE_ITEMS
+        page = self.read_items(first, min(PAGE_ITEMS, self.length - first))
+        self.pages[num] = page
+        self.pages_lru.append(num)
+        if len(self.pages_lru) > MAX_TABLE_PAGES:
+            del self.pages[self.pages_lru.pop(0)]
+        return page
+
+    def read_items(self, first, count):
+        data = self.index.read(self.base + first * self.itemsize,
+                               count * self.itemsize)
+        if self.typecode == "B":
+            items = array("B")
+            items.fromstring(data)
+            return items
+        return read_uints(data, 0, count)
+
+    def to_array(self):
+        """ All items in memory, tables of partial index grow with
+            loading of the book
+        """
+        return self.read_items(0, self.length)
+
+    def first(self, num):
+        """ First number of page, numbers are uint32 """
+        value = self.firsts.get(num)
+        if value is None:
+            value = self.firsts[num] = \
+                read_uints(self.index.read(self.base + num * PAGE_ITEMS *
+                                           OFFSET_SIZE, OFFSET_SIZE), 0, 1)[0]
+        return value
+
+    def find_page(self, value, right):
+        """ Returns the last page with the first number less than value
+            (or equal to it if right), -1 if there is no such page
+        """
+        low = 0
+        high = self.pages_num
+        while low < high:
+            mid = (low + high) // 2
+            first = self.first(mid)
+            if first < value or (right and first == value):
+                low = mid + 1
+            else:
+                high = mid
+        return low - 1
+
+    def bisect_left(self, value):
+        num = self.find_page(value, False)
+        if num < 0:
+            return 0
+        return num * PAGE_ITEMS + bisect.bisect_left(self.page(num), value)
+
+    def bisect_right(self, value):
+        num = self.find_page(value, True)
+        if num < 0:
+            return 0
+        return num * PAGE_ITEMS + bisect.bisect_right(self.page(num), value)
+
+    def memory_size(self):
+        return (len(self.firsts) * OFFSET_SIZE +
+                sum([len(page) * page.itemsize
+                     for page in self.pages.values()]))
+
+
+class WordArray(object):
+    """ Per word array of index (flags, meta), read with words by pages """
+
+    def __init__(self, index, column, length):
+        self.index = index
+        self.column = column
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.length
+        if idx < 0 or idx >= self.length:
+            raise IndexError("array index out of range")
+        # sum after the last word is in the last page
+        num = min(idx // PAGE_WORDS, self.index.blocks_num - 1)
+        return self.index.page(num)[self.column][idx - num * PAGE_WORDS]
+
+
+class BookIndex(object):
+    """ Words of the book read from the sidecar index. Has the same
+        len()/indexing interface as WordStore (flags, sentences,
+        paragraphs, chapters, meta and chunks too), but only a window
+        of MAX_PAGES pages of words with their flags and meta, and a
+        few pages of tables are in memory, so opening is cheap and
+        does not depend on book size. Pages are read from the memory
+        mapped file, or from the file itself without mmap (paged).
+    """
+
+    def __init__(self, book_path, paged=None, writable=False):
+        self.book_path = book_path
+        if paged is None:
+            paged = mmap is None
+        self.data = None
+        # page number -> arrays of words (OFFSETS ... TEXT)
+        # and page numbers by last use
+        self.pages = {}
+        self.pages_lru = []
+        self.page_reads = 0
+        self.index_file = open(index_path(book_path),
+                               writable and "r+b" or "rb")
+        try:
+            self.load(paged)
+        except:
+            self.close()
+            raise
+
+    def read(self, start, size):
+        if self.data is not None:
+            return self.data[start:start+size]
+        self.index_file.seek(start)
+        return self.index_file.read(size)
+
+    def load(self, paged=False):
+        self.index_file.seek(0, 2)
+        self.file_size = self.index_file.tell()
+        if not paged and mmap:
+            self.data = mmap.mmap(self.index_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+        (self.magic, self.version, self.partial, self.book_size,
+         self.book_mtime, self.timing_id, self.words_num, path_size,
+         tables_base, chapters_num, titles_size, sentences_num,
+         paragraphs_num, chunks_num, self.resume_offset,
+         self.resume_skip) = \
+            struct.unpack(HEADER_FMT, self.read(0, HEADER_SIZE))
+        if self.magic != MAGIC or self.version != VERSION:
+            # is_valid() fails on it, index will be rebuilt
+            return
+
+        self.path = self.read(HEADER_SIZE, path_size)
+        self.blocks_num = max(1, (self.words_num + PAGE_WORDS - 1) //
+                                 PAGE_WORDS)
+        self.blocks = self.read_uints(tables_base, self.blocks_num + 1)
+        self.flags = WordArray(self, FLAGS, self.words_num)
+
+        self.chapters = ChapterIndex()
+        chapters_base = tables_base + (self.blocks_num + 1) * OFFSET_SIZE
+        levels_base = chapters_base + chapters_num * OFFSET_SIZE
+        titles_base = levels_base + chapters_num
+        sentences_base = titles_base + titles_size
+        paragraphs_base = sentences_base + sentences_num * OFFSET_SIZE
+        chunks_base = paragraphs_base + paragraphs_num * OFFSET_SIZE
+        self.index_size = chunks_base + chunks_num * (OFFSET_SIZE + 2)
+        if chapters_num:
+            self.chapters.starts = self.read_uints(chapters_base,
+                                                   chapters_num)
+            self.chapters.levels.fromstring(self.read(levels_base,
+                                                      chapters_num))
+            self.chapters.titles = self.read(titles_base, titles_size).\
+                decode("utf-8").split(u"\n")
+        self.sentences = PagedArray(self, sentences_base, sentences_num)
+        self.paragraphs = PagedArray(self, paragraphs_base, paragraphs_num)
+
+        self.meta = WordMeta()
+        self.meta.focus = WordArray(self, FOCUS, self.words_num)
+        self.meta.pause = WordArray(self, PAUSE, self.words_num)
+        self.meta.delay = WordArray(self, DELAY, self.words_num)
+        self.meta.sums = WordArray(self, SUMS, self.words_num + 1)
+
+        self.chunks = ChunkIndex()
+        self.chunks.words = self
+        self.chunks.starts = PagedArray(self, chunks_base, chunks_num)
+        chunks_base += chunks_num * OFFSET_SIZE
+        self.chunks.focus = PagedArray(self, chunks_base, chunks_num, "B")
+        chunks_base += chunks_num
+        self.chunks.delay = PagedArray(self, chunks_base, chunks_num, "B")
+        self.chunks.next_word = self.words_num
+
+    def read_uints(self, start, count):
+        return read_uints(self.read(start, count * OFFSET_SIZE), 0, count)
+
+    def is_valid(self):
+        """ Index is valid for the book it was made of, meta is valid
+            for the current timing model, otherwise book is indexed again
+        """
+        return (self.magic == MAGIC and
+                self.version == VERSION and
+                self.timing_id == wordmeta.TIMING.model_id() and
+                self.path == self.book_path.encode("utf-8") and
+                (self.book_size, self.book_mtime) == book_key(self.book_path) and
+                self.file_size == self.index_size)
+
+    def __len__(self):
+        return self.words_num
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.words_num
+        if idx < 0 or idx >= self.words_num:
+            raise IndexError("word index out of range")
+
+        page = self.page(idx // PAGE_WORDS)
+        offsets = page[OFFSETS]
+        idx %= PAGE_WORDS
+        return page[TEXT][offsets[idx]:offsets[idx+1]].decode("utf-8")
+
+    def page(self, num):
+        """ Returns arrays of words of page (OFFSETS ... TEXT), offsets
+            are relative to page text.
+        """
+        page = self.pages.get(num)
+        if page is not None:
+            if self.pages_lru[-1] != num:
+                self.pages_lru.remove(num)
+                self.pages_lru.append(num)
+            return page
+
+        start = self.blocks[num]
+        data = self.read(start, self.blocks[num+1] - start)
+        count = min(PAGE_WORDS, self.words_num - num * PAGE_WORDS)
+        page = [read_uints(data, 0, count + 1)]
+        pos = (count + 1) * OFFSET_SIZE
+        # flags, focus, pause and delay
+        for i in xrange(4):
+            column = array("B")
+            column.fromstring(data[pos:pos+count])
+            page.append(column)
+            pos += count
+        page.append(read_uints(data, pos, count + 1))
+        page.append(data[pos+(count+1)*OFFSET_SIZE:])
+        self.pages[num] = page
+        self.page_reads += 1
+
+        self.pages_lru.append(num)
+        if len(self.pages_lru) > MAX_PAGES:
+            del self.pages[self.pages_lru.pop(0)]
+        return page
+
+    def prefetch(self, idx, direction=1):
+        """ Read page of words which are read soon after word idx
+            in direction (1 forward, -1 backward)
+        """
+        if self.data is not None:
+            return
+        idx += direction * PREFETCH_WORDS
+        if idx >= 0 and idx < self.words_num:
+            self.page(idx // PAGE_WORDS)
+
+    def memory_size(self):
+        """ Approximate size of words data in memory in bytes """
+        if self.data is not None:
+            return self.file_size
+        size = len(self.blocks) * OFFSET_SIZE
+        for table in (self.sentences, self.paragraphs, self.chunks.starts,
+                      self.chunks.focus, self.chunks.delay):
+            size += table.memory_size()
+        for page in self.pages.values():
+            for column in page[:TEXT]:
+                size += len(column) * column.itemsize
+            size += len(page[TEXT])
+        return size
+
+    def __iter__(self):
+        for idx in xrange(self.words_num):
+            yield self[idx]
+
+    def close(self):
+        if mmap and self.data is not None:
+            self.data.close()
+        self.data = None
+        self.pages = {}
+        self.pages_lru = []
+        self.index_file.close()
+
+    def clear(self):
+        self.close()
+
+
+class TailArray(object):
+    """ Per word array (flags, meta) of words of partial index, which
+        are read from it, and of words loaded after them from base on
+    """
+
+    def __init__(self, head, base, tail):
+        self.head = head
+        self.base = base
+        self.tail = tail
+
+    def __len__(self):
+        return self.base + len(self.tail)
+
+    def __getitem__(self, idx):
+        # loaded words are read the most
+        if idx >= self.base:
+            return self.tail[idx - self.base]
+        if idx < 0:
+            idx += len(self)
+            if idx < 0:
+                raise IndexError("array index out of range")
+            return self[idx]
+        return self.head[idx]
+
+    def __getslice__(self, start, end):
+        # IndexWriter writes only loaded words
+        return self.tail[start - self.base:end - self.base]
+
+    # only loaded words are changed
+
+    def __setitem__(self, idx, value):
+        if idx < 0:
+            idx += len(self)
+        self.tail[idx - self.base] = value
+
+    def __delitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        del self.tail[idx - self.base]
+
+    def append(self, value):
+        self.tail.append(value)
+
+
+class ResumedWords(WordStore):
+    """ Words of the book whose loading is resumed from partial index.
+        Words of its blocks are read from it by pages, words loaded
+        after them are added like to WordStore. The last word of index
+        is in memory too, as the last word its flags and meta can be
+        updated by loading. Tables of index are read into memory,
+        they grow with loading.
+    """
+
+    def __init__(self, index):
+        self.index = None
+        WordStore.__init__(self)
+        self.index = index
+        self.base = base = index.words_num - 1
+        self.chars.fromunicode(index[base])
+        self.offsets.append(len(self.chars))
+        self.flags = TailArray(index.flags, base,
+                               array("B", [index.flags[base]]))
+        self.sentences = index.sentences.to_array()
+        self.paragraphs = index.paragraphs.to_array()
+        self.chapters = index.chapters
+
+        self.meta = WordMeta()
+        for name in ("focus", "pause", "delay"):
+            column = getattr(index.meta, name)
+            setattr(self.meta, name,
+                    TailArray(column, base, array("B", [column[base]])))
+        sums = index.meta.sums
+        self.meta.sums = TailArray(sums, base, array(OFFSET_TYPE,
+                                                     [sums[base],
+                                                      sums[base + 1]]))
+
+        self.chunks = ChunkIndex()
+        self.chunks.words = self
+        for name in ("starts", "focus", "delay"):
+            setattr(self.chunks, name,
+                    getattr(index.chunks, name).to_array())
+        # the last chunk is made again with the next words
+        self.chunks.open = True
+
+    def __len__(self):
+        return self.base + len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx >= self.base:
+            return WordStore.__getitem__(self, idx - self.base)
+        if idx < 0:
+            idx += len(self)
+            if idx < 0:
+                raise IndexError("word index out of range")
+            return self[idx]
+        return self.index[idx]
+
+    def prefetch(self, idx, direction=1):
+        self.index.prefetch(idx, direction)
+
+    def memory_size(self):
+        # flags of index words are counted by index
+        return (WordStore.memory_size(self) - self.base +
+                self.index.memory_size())
+
+    def clear(self):
+        WordStore.clear(self)
+        if self.index is not None:
+            self.index.close()
+            self.index = None
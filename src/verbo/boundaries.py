@@ -0,0 +1,50 @@
+"""
+    Seeking over sorted arrays of sentence and paragraph starts.
+"""
+
+import bisect
+
+
+def bisect_left(starts, idx):
+    """ bisect.bisect_left() which uses own search of paged arrays
+        of index, they read only pages on the way to idx
+    """
+    search = getattr(starts, "bisect_left", None)
+    if search is None:
+        return bisect.bisect_left(starts, idx)
+    return search(idx)
+
+
+def bisect_right(starts, idx):
+    search = getattr(starts, "bisect_right", None)
+    if search is None:
+        return bisect.bisect_right(starts, idx)
+    return search(idx)
+
+
+def prev_start(starts, idx):
+    """ Start before word idx: start of current sentence (paragraph)
+        or of the previous one if idx is already at the start.
+    """
+    i = bisect_left(starts, idx) - 1
+    if i < 0:
+        return 0
+    return starts[i]
+
+
+def next_start(starts, idx, words_num):
+    """ Start of the sentence (paragraph) after word idx,
+        words_num is index of the last word.
+    """
+    i = bisect_right(starts, idx)
+    if i >= len(starts) or starts[i] > words_num:
+        return words_num
+    return starts[i]
+
+
+def current_start(starts, idx):
+    """ Start of the sentence (paragraph) containing word idx """
+    i = bisect_right(starts, idx) - 1
+    if i < 0:
+        return 0
+    return starts[i]
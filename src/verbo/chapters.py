@@ -0,0 +1,44 @@
+"""
+    Chapters of a book as word index ranges.
+"""
+
+import bisect
+from array import array
+
+from wordstore import OFFSET_TYPE
+
+
+class ChapterIndex(object):
+    """ Chapter i starts at word starts[i] and lasts until the start
+        of the next one. Starts are sorted, so chapter of any word
+        is found by binary search.
+    """
+
+    def __init__(self):
+        self.starts = array(OFFSET_TYPE)
+        self.levels = array("B")
+        self.titles = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start, level, title=u""):
+        self.starts.append(start)
+        self.levels.append(min(level, 255))
+        self.titles.append(title)
+
+    def set_title(self, idx, title):
+        # titles are kept in one line
+        self.titles[idx] = u" ".join(title.split())
+
+    def find(self, word_idx):
+        """ Returns index of chapter containing the word or -1 """
+        return bisect.bisect_right(self.starts, word_idx) - 1
+
+    def menu_items(self):
+        """ Titles indented by chapter level for popup menu """
+        items = []
+        for i in xrange(len(self.titles)):
+            title = self.titles[i] or u"#%d" % (i + 1)
+            items.append(u"  " * self.levels[i] + title)
+        return items
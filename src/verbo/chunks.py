@@ -0,0 +1,165 @@
+"""
+    Frames of the reading loop: single words or chunks of short words.
+"""
+
+from array import array
+
+from boundaries import bisect_right
+from wordstore import OFFSET_TYPE, PARA_END, SENT_END
+from wordmeta import NO_PAUSE, DELAY_UNIT
+
+# words of chunk at most
+MAX_WORDS = 3
+# characters of chunk text at most, with spaces
+MAX_CHARS = 13
+# longer words are content words, shorter ones are joined to them
+SHORT_WORD = 3
+# chunk is shown at least for two word delays, chunk mode speed limit
+# is twice higher, so chunk frame is not shorter than frame of a word
+# at the highest speed of word mode
+MIN_DELAY = int(2 * DELAY_UNIT)
+
+
+class WordFrames(object):
+    """ Every word is a frame """
+
+    def __init__(self, words):
+        self.words = words
+        self.focus = words.meta.focus
+        self.delay = words.meta.delay
+
+    def __len__(self):
+        return len(self.words)
+
+    def ready(self):
+        """ Number of frames which can be shown """
+        return len(self.words)
+
+    def find(self, word_idx):
+        return word_idx
+
+    def start(self, frame):
+        return frame
+
+    def size(self, frame):
+        return 1
+
+    def text(self, frame):
+        return self.words[frame]
+
+
+class ChunkIndex(object):
+    """ Words grouped into chunks shown as one frame. Chunk i starts at
+        word starts[i] and lasts until the start of the next one.
+        Chunk ends at punctuation pause, sentence or paragraph end.
+        Short (function) words are joined to the following word, so
+        chunk is like "of the house" or "in time".
+        focus is focus letter in chunk text (on its longest word),
+        delay is the sum of delays of chunk words, at least MIN_DELAY.
+    """
+
+    def __init__(self):
+        self.words = None
+        self.starts = array(OFFSET_TYPE)
+        self.focus = array("B")
+        self.delay = array("B")
+        # last chunk can get more words when book is loaded further
+        self.open = False
+        # first word after closed chunks
+        self.next_word = 0
+        # words at the last update
+        self.words_num = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def ready(self):
+        return len(self.starts) - int(self.open)
+
+    def find(self, word_idx):
+        """ Returns index of chunk containing the word """
+        return max(0, bisect_right(self.starts, word_idx) - 1)
+
+    def start(self, frame):
+        return self.starts[frame]
+
+    def end(self, frame):
+        if frame + 1 < len(self.starts):
+            return self.starts[frame + 1]
+        return len(self.words)
+
+    def size(self, frame):
+        return self.end(frame) - self.starts[frame]
+
+    def text(self, frame):
+        words = self.words
+        return u" ".join([words[idx] for idx in
+                          xrange(self.starts[frame], self.end(frame))])
+
+    def update(self, words, complete=False):
+        """ Group words added since the last update. Last chunk is left
+            open unless book is complete.
+        """
+        self.words = words
+        # last word can get flags and delay after it was added, so chunk
+        # closed on it is made again like the open one
+        if self.open or (self.starts and self.next_word == self.words_num):
+            self.open = False
+            self.next_word = self.starts[-1]
+            del self.starts[-1]
+            del self.focus[-1]
+            del self.delay[-1]
+
+        meta = words.meta
+        flags = words.flags
+        words_num = len(words)
+        start = idx = self.next_word
+        chars = 0
+        content = False
+
+        while idx < words_num:
+            word_len = len(words[idx])
+            is_short = word_len <= SHORT_WORD
+            # function word after content word starts a new chunk
+            if idx > start and (chars + 1 + word_len > MAX_CHARS or
+                                (content and is_short)):
+                self.add(words, start, idx)
+                start = idx
+                chars = 0
+                content = False
+
+            chars += (idx > start) + word_len
+            content = content or not is_short
+            idx += 1
+            if (idx - start == MAX_WORDS or meta.pause[idx - 1] != NO_PAUSE or
+                    flags[idx - 1] & (PARA_END | SENT_END)):
+                self.add(words, start, idx)
+                start = idx
+                chars = 0
+                content = False
+
+        self.words_num = words_num
+        self.next_word = start
+        if start < words_num:
+            self.add(words, start, words_num)
+            if not complete:
+                self.open = True
+                return
+            self.next_word = words_num
+
+    def add(self, words, start, end):
+        meta = words.meta
+        # focus on the longest word
+        focus = offset = longest = 0
+        delay = 0
+        for idx in xrange(start, end):
+            word_len = len(words[idx])
+            if word_len > longest:
+                longest = word_len
+                focus = offset + meta.focus[idx]
+            offset += word_len + 1
+            delay += meta.delay[idx]
+
+        self.starts.append(start)
+        self.focus.append(min(focus, 255))
+        self.delay.append(min(max(delay, MIN_DELAY), 255))
@@ -1,6 +1,28 @@
 import appuifw
 import graphics
 
+import fontmetrics
+
+
+def intersects(rect1, rect2):
+    return (rect1[0] < rect2[2] and rect2[0] < rect1[2] and
+            rect1[1] < rect2[3] and rect2[1] < rect1[3])
+
+
+def union(rect1, rect2):
+    """ Bounding rect of two (x1, y1, x2, y2) rects """
+    return (min(rect1[0], rect2[0]), min(rect1[1], rect2[1]),
+            max(rect1[2], rect2[2]), max(rect1[3], rect2[3]))
+
+
+def format_time(seconds):
+    """ h:mm:ss or m:ss """
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return u"%d:%02d:%02d" % (hours, minutes, seconds)
+    return u"%d:%02d" % (minutes, seconds)
+
 
 class Draw(object):
 
@@ -9,51 +31,129 @@ class Draw(object):
     RGB_RED = (237, 28, 36)
     WORD_FONT = ("normal", 28)
     INFO_FONT = ("normal", 16)
+    INFO_Y = 20
+    INFO_LINE = 18
+    # size of ring of pre-rendered word frames
+    FRAMES = 6
 
     def __init__(self):
         self.canvas = None
         self.img = None
+        self.bg = None
         self.canvas = appuifw.Canvas(redraw_callback=self.redraw)
-        self.img = graphics.Image.new(self.canvas.size)
+        self.glyphs = fontmetrics.GlyphWidths(
+            self.canvas.measure_text, Draw.WORD_FONT,
+            fontmetrics.cache_path(Draw.WORD_FONT))
+        self.glyphs.load()
+        self.init_scene()
 
-        self.screen_width = self.canvas.size[0]
-        self.screen_height = self.canvas.size[1]
+    def close(self):
+        # keep measured glyphs for the next time
+        self.glyphs.save()
+
+    def init_scene(self):
+        """ Prepare images for current canvas size. Static part of
+            the scene is rendered once into self.bg, frames restore
+            only rects drawn over it and blit only changed rect.
+        """
+        self.size = self.canvas.size
+        self.screen_width = self.size[0]
+        self.screen_height = self.size[1]
         self.focus_x = self.screen_width / 3.
         self.focus_y = self.screen_height / 2.
 
-    def clear(self):
-        self.img.clear(Draw.RGB_WHITE)
+        # vertical extent of text relative to baseline
+        top, bottom = self.canvas.measure_text(u"Wg", Draw.WORD_FONT)[0][1::2]
+        self.word_top = int(self.focus_y) + top - 1
+        self.word_bottom = int(self.focus_y) + bottom + 2
+        top, bottom = self.canvas.measure_text(u"Wg", Draw.INFO_FONT)[0][1::2]
+        self.info_rect = (0, 0, self.screen_width,
+                          Draw.INFO_Y + Draw.INFO_LINE + bottom + 2)
+
+        self.bg = graphics.Image.new(self.size)
+        self.bg.clear(Draw.RGB_WHITE)
+        self.background()
+        self.img = graphics.Image.new(self.size)
+        self.img.blit(self.bg)
+
+        # ring of word band images, frame of word idx is in slot
+        # idx % FRAMES, images are allocated once per canvas size
+        self.band = (0, self.word_top, self.screen_width, self.word_bottom)
+        band_size = (self.screen_width, self.word_bottom - self.word_top)
+        self.frames = [graphics.Image.new(band_size)
+                       for i in xrange(Draw.FRAMES)]
+        self.invalidate_frames()
+        # rects drawn over background since the last erase()
+        self.drawn = []
+        # rects of the canvas to be updated by update()
+        self.dirty = [(0, 0, self.screen_width, self.screen_height)]
+
+    def check_size(self):
+        """ Rebuild scene if canvas size is changed (orientation) """
+        if self.canvas.size != self.size:
+            self.init_scene()
+
+    def erase(self):
+        """ Restore background only under previously drawn rects """
+        self.check_size()
+        for rect in self.drawn:
+            self.img.blit(self.bg, target=rect[:2], source=rect)
+            self.add_dirty(rect)
+        self.drawn = []
+
+    def add_dirty(self, rect):
+        # overlapping rects are blitted as one
+        for i, dirty in enumerate(self.dirty):
+            if intersects(dirty, rect):
+                self.dirty[i] = union(dirty, rect)
+                return
+        self.dirty.append(rect)
+
+    def add_drawn(self, rect):
+        self.drawn.append(rect)
+        self.add_dirty(rect)
 
     def redraw(self, rect=(0, 0, 0, 0)):
         if not self.canvas:
             return
         if self.img:
             self.canvas.blit(self.img)
+        self.dirty = []
+
+    def update(self):
+        """ Blit changed rects of the scene to canvas """
+        if not self.canvas:
+            return
+        for rect in self.dirty:
+            self.canvas.blit(self.img, target=rect[:2], source=rect)
+        self.dirty = []
 
     def background(self):
         # top line
-        self.img.line((self.focus_x,
-                      0,
-                      self.focus_x,
-                      self.focus_y-30),
-                      width=1,
-                      outline=Draw.RGB_BLACK)
+        self.bg.line((self.focus_x,
+                     0,
+                     self.focus_x,
+                     self.focus_y-30),
+                     width=1,
+                     outline=Draw.RGB_BLACK)
         # buttom line
-        self.img.line((self.focus_x,
-                      self.screen_height,
-                      self.focus_x,
-                      self.focus_y+10),
-                      width=1,
-                      outline=Draw.RGB_BLACK)
-
-    def text(self, text, color, x, y, font):
-        self.img.text((x, y),
+        self.bg.line((self.focus_x,
+                     self.screen_height,
+                     self.focus_x,
+                     self.focus_y+10),
+                     width=1,
+                     outline=Draw.RGB_BLACK)
+
+    def text(self, text, color, x, y, font, image=None):
+        if image is None:
+            image = self.img
+        image.text((x, y),
                         text,
                         fill=color,
                         font=font)
 
     def text_width(self, text):
-        return self.canvas.measure_text(text, Draw.WORD_FONT)[0][2]
+        return self.glyphs.width(text)
 
     def get_prefix(self, word, focus):
         if focus == 0:
@@ -81,42 +181,103 @@ class Draw(object):
 
     def word(self, word, focus_letter):
         """
-            Draw one word. Separate word by prefix,
-            middle marked letter and last part.
+            Draw one word. It is shown on canvas by update().
         """
-        self.background()
+        left, right = self.draw_word(self.img, word, focus_letter,
+                                     self.focus_y)
+        self.add_drawn((left, self.word_top, right, self.word_bottom))
 
+    def draw_word(self, image, word, focus_letter, y):
+        """
+            Draw word into image at baseline y. Separate word by prefix,
+            middle marked letter and last part.
+            Returns left and right bounds of drawn word.
+        """
         prefix, prefix_w = self.get_prefix(word, focus_letter)
         fletter, fletter_w = self.get_focus_letter(word, focus_letter)
         # half width
         fletter_hw = fletter_w / 2.
         postfix = self.get_postfix(word, focus_letter)
+        left = self.focus_x - prefix_w - fletter_hw
+        right = self.focus_x + fletter_hw
 
         # draw all parts
         if prefix_w > 0:
             self.text(prefix,
                       Draw.RGB_BLACK,
-                      self.focus_x - prefix_w - fletter_hw,
-                      self.focus_y,
-                      Draw.WORD_FONT)
+                      left,
+                      y,
+                      Draw.WORD_FONT,
+                      image)
 
         self.text(fletter,
                   Draw.RGB_RED,
                   self.focus_x - fletter_hw,
-                  self.focus_y,
-                  Draw.WORD_FONT)
+                  y,
+                  Draw.WORD_FONT,
+                  image)
 
         if postfix:
             self.text(postfix,
                       Draw.RGB_BLACK,
-                      self.focus_x + fletter_hw,
-                      self.focus_y,
-                      Draw.WORD_FONT)
+                      right,
+                      y,
+                      Draw.WORD_FONT,
+                      image)
+            right += self.text_width(postfix)
+
+        return max(0, int(left) - 1), min(self.screen_width, int(right) + 2)
+
+    def invalidate_frames(self):
+        self.frame_keys = [-1] * Draw.FRAMES
+        self.frame_bounds = [None] * Draw.FRAMES
 
-        self.redraw()
+    def has_frame(self, key):
+        return self.frame_keys[key % Draw.FRAMES] == key
 
-    def info(self, wpm):
-        self.text(u"%swpm" % wpm,
+    def render_frame(self, key, word, focus_letter):
+        """ Pre-render word into frame ring, key is word index """
+        self.check_size()
+        slot = key % Draw.FRAMES
+        image = self.frames[slot]
+        image.blit(self.bg, source=self.band)
+        self.frame_bounds[slot] = self.draw_word(image, word, focus_letter,
+                                                 self.focus_y - self.word_top)
+        self.frame_keys[slot] = key
+
+    def show_frame(self, key):
+        """ Show pre-rendered frame by one blit. Returns False if there
+            is no frame for the key.
+        """
+        if not self.has_frame(key):
+            return False
+
+        slot = key % Draw.FRAMES
+        left, right = self.frame_bounds[slot]
+        self.img.blit(self.frames[slot], target=(left, self.word_top),
+                      source=(left, 0, right, self.word_bottom - self.word_top))
+        self.add_drawn((left, self.word_top, right, self.word_bottom))
+        return True
+
+    def info(self, wpm, real_wpm=0, progress=None):
+        """ Show speed, and really achieved speed if it is known.
+            progress is (percent, words left, seconds left) or None.
+        """
+        if real_wpm:
+            info = u"%swpm (%s)" % (wpm, real_wpm)
+        else:
+            info = u"%swpm" % wpm
+        self.text(info,
                   Draw.RGB_BLACK,
-                  10, 20,
+                  10, Draw.INFO_Y,
                   Draw.INFO_FONT)
+
+        if progress is not None:
+            percent, words_left, time_left = progress
+            info = u"%d%%  %d words  %s left" % (percent, words_left,
+                                                 format_time(time_left))
+            self.text(info,
+                      Draw.RGB_BLACK,
+                      10, Draw.INFO_Y + Draw.INFO_LINE,
+                      Draw.INFO_FONT)
+        self.add_drawn(self.info_rect)
@@ -5,10 +5,17 @@
 
 from xml.parsers import expat
 
+from wordstore import WordStore, PARA_END
+from chapters import ChapterIndex
+
 
 class XMLParser(object):
 
     def __init__(self):
+        self.create_parser()
+
+    def create_parser(self):
+        """ Expat parser can't be reused, so create new one for every parse """
         self.parser = expat.ParserCreate()
         # handlers
         self.parser.CharacterDataHandler = self.handle_char
@@ -27,23 +34,218 @@ class XMLParser(object):
 
 class FB2Parser(XMLParser):
 
+    CHUNK_SIZE = 16384
+
     def __init__(self, book_path):
         self.book_path = book_path
+        self.words = []
+        self.flags = []
+        # unfinished word from the end of previous character data
+        self.tail = u""
+        self.body_level = 0
+        self.chapters = ChapterIndex()
+        self.section_level = 0
+        self.title_text = None
+        # number of words already yielded by iter_tokens
+        self.emitted = 0
         XMLParser.__init__(self)
 
+    def create_parser(self):
+        """ Text is collected only inside <body>, outside it character
+            data handler is removed, so expat skips <description> and
+            <binary> images without calling python code.
+        """
+        XMLParser.create_parser(self)
+        self.parser.CharacterDataHandler = None
+        self.body_level = 0
+        self.chapters = ChapterIndex()
+        self.section_level = 0
+        self.title_text = None
+        self.emitted = 0
+
     def parse_words(self):
+        words = WordStore()
+        for word, flags in self.iter_tokens():
+            words.append(word, flags)
+        words.chapters = self.chapters
+        self.words = words
+
+        return words
+
+    def iter_words(self, chunk_size=CHUNK_SIZE):
+        """ Feed book to expat by chunks of chunk_size bytes
+            and yield words as soon as they are parsed.
+            Only one chunk of the file is kept in memory.
+        """
+        for word, flags in self.iter_tokens(chunk_size):
+            yield word
+
+    def iter_tokens(self, chunk_size=CHUNK_SIZE):
+        """ Same as iter_words, but yields (word, flags) pairs """
+        self.create_parser()
+        # words parsed from the current chunk and their flags
         self.words = []
-        book_file = open(self.book_path)
-        book_txt = book_file.read()
-        book_file.close()
+        self.flags = []
+        self.tail = u""
+
+        book_file = open(self.book_path, "rb")
+        try:
+            while True:
+                chunk = book_file.read(chunk_size)
+                self.parser.Parse(chunk, not chunk)
 
-        self.parser.Parse(book_txt)
+                # flags of the last word may be set by the next chunk
+                ready = len(self.words)
+                if chunk:
+                    ready -= 1
+                for i in xrange(ready):
+                    yield self.words[i], self.flags[i]
+                del self.words[:ready]
+                del self.flags[:ready]
+                self.emitted += max(ready, 0)
 
-        return self.words
+                if not chunk:
+                    break
+        finally:
+            book_file.close()
 
     def handle_char(self, data):
         self.append_words(data)
+        if self.title_text is not None:
+            self.title_text += data
+
+    def handle_start(self, name, attrs):
+        self.flush_tail()
+        if name == "body":
+            self.body_level += 1
+            self.parser.CharacterDataHandler = self.handle_char
+        elif name == "section":
+            self.section_level += 1
+            self.chapters.add(self.emitted + len(self.words),
+                              self.section_level - 1)
+        elif name == "title" and self.section_level:
+            self.title_text = u""
+
+    def handle_end(self, name):
+        self.flush_tail()
+        if name == "p" and self.flags:
+            self.flags[-1] |= PARA_END
+        elif name == "body":
+            self.body_level -= 1
+            if not self.body_level:
+                self.parser.CharacterDataHandler = None
+        elif name == "section":
+            self.section_level -= 1
+        elif name == "title" and self.title_text is not None:
+            self.chapters.set_title(len(self.chapters) - 1, self.title_text)
+            self.title_text = None
 
     def append_words(self, string):
-        for word in string.split():
+        # expat may split text at any place (chunk border, entity),
+        # so last word is finished only by whitespace or element
+        words = (self.tail + string).split()
+        self.tail = u""
+        if words and not string[-1].isspace():
+            self.tail = words.pop()
+
+        for word in words:
             self.words.append(word)
+            self.flags.append(0)
+
+    def flush_tail(self):
+        if self.tail:
+            self.words.append(self.tail)
+            self.flags.append(0)
+            self.tail = u""
+
+
+class StopParsing(Exception):
+    pass
+
+
+class FB2MetaParser(XMLParser):
+    """ Reads book info from <title-info> and stops at the end of
+        <description>, so it costs the same for a book of any size.
+    """
+
+    CHUNK_SIZE = 4096
+    # average size of word with markup, for words number estimation
+    BYTES_PER_WORD = 8
+    FIELDS = {"book-title": "title",
+              "lang": "lang",
+              "annotation": "annotation"}
+    # parts of name in <author>, translators have them too
+    NAME_PARTS = ("first-name", "middle-name", "last-name")
+    AUTHORS_SEP = u", "
+
+    def __init__(self, book_path):
+        self.book_path = book_path
+        self.stack = []
+        self.meta = {}
+        self.authors = []
+        self.author = u""
+        XMLParser.__init__(self)
+
+    def parse_meta(self):
+        """ Returns dict with "title", "author", "lang", "annotation"
+            (empty if missing) and "words" - estimated number of words.
+        """
+        self.create_parser()
+        self.stack = []
+        self.meta = {"title": u"", "author": u"", "lang": u"",
+                     "annotation": u""}
+        self.authors = []
+        self.author = u""
+        self.description_end = 0
+
+        book_file = open(self.book_path, "rb")
+        try:
+            try:
+                while True:
+                    chunk = book_file.read(FB2MetaParser.CHUNK_SIZE)
+                    self.parser.Parse(chunk, not chunk)
+                    if not chunk:
+                        break
+            except StopParsing:
+                pass
+            book_file.seek(0, 2)
+            size = book_file.tell()
+        finally:
+            book_file.close()
+
+        self.meta["author"] = FB2MetaParser.AUTHORS_SEP.join(self.authors)
+        for key in self.meta:
+            self.meta[key] = u" ".join(self.meta[key].split())
+        self.meta["words"] = ((size - self.description_end) //
+                              FB2MetaParser.BYTES_PER_WORD)
+
+        return self.meta
+
+    def handle_start(self, name, attrs):
+        self.stack.append(name)
+
+    def handle_end(self, name):
+        self.stack.pop()
+        if name == "description":
+            self.description_end = self.parser.CurrentByteIndex
+            raise StopParsing()
+        if name == "author" and "title-info" in self.stack:
+            author = u" ".join(self.author.split())
+            if author:
+                self.authors.append(author)
+            self.author = u""
+        elif name in FB2MetaParser.NAME_PARTS:
+            self.author += u" "
+
+    def handle_char(self, data):
+        if "title-info" not in self.stack:
+            return
+        if self.stack[-1] in FB2MetaParser.NAME_PARTS:
+            if self.stack[-2] == "author":
+                self.author += data
+            return
+        for name in self.stack[self.stack.index("title-info")+1:]:
+            field = FB2MetaParser.FIELDS.get(name)
+            if field is not None:
+                self.meta[field] += data
+                return
@@ -41,52 +41,117 @@ if sel is not None:
 """
 
 import os
+import stat
 import e32
 from appuifw import *
 import re
 
+# (directory, mask) -> (directory mtime, dirs, files)
+LISTING_CACHE = {}
+MAX_CACHED_DIRS = 32
+
+def list_dir(path, mask_re):
+    """ Returns sorted (dirs, files) of path with their real names,
+        files are filtered by compiled mask. Each entry is classified
+        by one stat. Listings are cached until directory modification
+        time changes.
+    """
+    path_enc = path.encode('utf-8')
+    mtime = os.stat( path_enc ).st_mtime
+    key = ( path, mask_re.pattern )
+    cached = LISTING_CACHE.get( key )
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    dirs = []
+    files = []
+    for e in os.listdir( path_enc ):
+        try:
+            mode = os.stat( os.path.join(path_enc,e) ).st_mode
+        except OSError:
+            continue
+        if stat.S_ISDIR( mode ):
+            dirs.append( e.decode('utf-8') )
+        elif stat.S_ISREG( mode ):
+            f = e.decode('utf-8')
+            if mask_re.match( f.lower() ):
+                files.append( f )
+    # same order as names shown by FileSel
+    dirs.sort( key=unicode.upper )
+    files.sort( key=unicode.lower )
+
+    if len(LISTING_CACHE) >= MAX_CACHED_DIRS:
+        LISTING_CACHE.clear()
+    LISTING_CACHE[key] = ( mtime, dirs, files )
+    return dirs, files
+
+def walk_files(root, mask_re):
+    """ Yields paths of files matching compiled mask in root
+        and all its subdirectories.
+    """
+    stack = [ root ]
+    while stack:
+        d = stack.pop()
+        try:
+            dirs, files = list_dir( d, mask_re )
+        except OSError:
+            continue
+        for f in files:
+            yield os.path.join( d, f )
+        dirs = dirs[:]
+        dirs.reverse()
+        stack.extend( [ os.path.join(d,sub) for sub in dirs ] )
+
 class FileSel(object):
-    def __init__(self,init_dir = "", mask = ".*"):
+    SELECT_DIR = u"[Select this folder]"
+
+    def __init__(self,init_dir = "", mask = ".*", select_dir = False):
+        """ With select_dir=True folder is selected instead of file """
         self.cur_dir = unicode(init_dir)
         if not os.path.exists(self.cur_dir):
             self.cur_dir = ""
         self.mask = mask
+        self.mask_re = re.compile(mask)
+        self.select_dir = select_dir
         self.fill_items()
         
     def fill_items(self):
         if self.cur_dir == u"":
             self.items = [ unicode(d + "\\") for d in e32.drive_list() ]
+            self.names = self.items
+            self.dirs_num = len(self.items)
         else:
-            entries = [ e.decode('utf-8')
-                        for e in os.listdir( self.cur_dir.encode('utf-8') ) ]
-            d = self.cur_dir
-            dirs  = [ e.upper() for e in entries
-                      if os.path.isdir(os.path.join(d,e).encode('utf-8'))  ]
-            
-            files = [ e.lower() for e in entries
-                      if os.path.isfile(os.path.join(d,e).encode('utf-8')) ]
-            
-            files = [ f for f in files
-                      if re.match(self.mask,f) ]
-            dirs.sort()
-            files.sort()
-            dirs.insert( 0, u".." )
-            self.items = dirs + files
+            dirs, files = list_dir( self.cur_dir, self.mask_re )
+            # real names are kept for paths, case is changed for display
+            self.names = [ u".." ] + dirs
+            self.items = [ u".." ] + [ d.upper() for d in dirs ]
+            if self.select_dir:
+                self.names.insert( 0, FileSel.SELECT_DIR )
+                self.items.insert( 0, FileSel.SELECT_DIR )
+            self.dirs_num = len(self.items)
+            if not self.select_dir:
+                self.names += files
+                self.items += [ f.lower() for f in files ]
         
     def run(self):
         while True:
-            item = popup_menu(self.items,u"Select file:")
+            if self.select_dir:
+                item = popup_menu(self.items,u"Select folder:")
+            else:
+                item = popup_menu(self.items,u"Select file:")
             if item is None:
                 return None
-            f = self.items[item]
+            f = self.names[item]
+            if self.select_dir and f == FileSel.SELECT_DIR:
+                return self.cur_dir
             d = os.path.abspath( os.path.join(self.cur_dir,f) )
-            if os.path.isdir( d.encode('utf-8') ):
+            if item < self.dirs_num:
                 if f == u".." and len(self.cur_dir) == 3:
                     self.cur_dir = u""
                 else:
                     self.cur_dir = d 
                 self.fill_items()
-            elif os.path.isfile( d.encode('utf-8') ):
+            else:
                 return d
               
 
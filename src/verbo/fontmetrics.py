@@ -0,0 +1,208 @@
+"""
+    Advance widths of glyphs of the reading font.
+
+    Width of text is a sum of advances of its characters, so it's
+    computed without native measure_text() calls. Advance of every
+    character is measured once, when it is met first, and saved into
+    cache file (CACHE_DIR + font name) for the next sessions.
+    Text with complex script characters (combining marks, right to
+    left and Indic scripts) is still measured as a whole, shaping
+    changes its width. Fonts with kerning (or fractional advances) are
+    detected by measuring texts with new characters and CHECK_TEXTS
+    first texts of session: if width of text differs from the sum of
+    advances by more than TOLERANCE pixels in MAX_MISMATCHES texts,
+    all text of the font is measured as well.
+
+    File layout (all numbers are little-endian):
+        header  HEADER_FMT: magic, version, kerned flag, glyphs number
+        glyphs  GLYPH_FMT code point and advance of every glyph,
+                COMPLEX_WIDTH advance for complex script characters
+"""
+
+import os
+import struct
+
+# directory of cache files, set by application
+CACHE_DIR = None
+MAGIC = "VBGW"
+VERSION = 2
+HEADER_FMT = "<4sHBI"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+# code points beyond 0xffff on wide unicode builds need uint32
+GLYPH_FMT = "<IH"
+GLYPH_SIZE = struct.calcsize(GLYPH_FMT)
+COMPLEX_WIDTH = 0xffff
+# pixels width of text from advances can differ from measured one,
+# single kerning pair or rounding doesn't make font kerned
+TOLERANCE = 1
+# texts with larger difference before font is taken as kerned
+MAX_MISMATCHES = 3
+# texts of known characters measured to check the font
+CHECK_TEXTS = 32
+
+# code point ranges of characters which can't be measured alone
+COMPLEX_RANGES = ((0x0300, 0x036f),    # combining diacritical marks
+                  (0x0483, 0x0489),    # combining cyrillic
+                  (0x0590, 0x08ff),    # hebrew, arabic, syriac, thaana
+                  (0x0900, 0x109f),    # indic, thai, lao, tibetan, myanmar
+                  (0x1100, 0x11ff),    # hangul jamo
+                  (0x1780, 0x18af),    # khmer, mongolian
+                  (0x1dc0, 0x1dff),    # combining marks supplement
+                  (0x200b, 0x200f),    # zero width and direction marks
+                  (0x20d0, 0x20ff),    # combining marks for symbols
+                  (0xd800, 0xdfff),    # surrogates
+                  (0xfb1d, 0xfdff),    # hebrew and arabic presentation
+                  (0xfe00, 0xfe0f),    # variation selectors
+                  (0xfe20, 0xfe2f),    # combining half marks
+                  (0xfe70, 0xfeff))    # arabic presentation, BOM
+
+
+def is_complex(ch):
+    code = ord(ch)
+    if code < 0x0300:
+        return False
+    for first, last in COMPLEX_RANGES:
+        if code < first:
+            return False
+        if code <= last:
+            return True
+    return False
+
+
+def cache_path(font):
+    if CACHE_DIR is None:
+        return None
+    name = u"-".join([unicode(part) for part in font])
+    return os.path.join(CACHE_DIR, u"verbo-%s.vbg" % name)
+
+
+class GlyphWidths(object):
+    """ Width of text in font from per character advances.
+        measure is measure_text() of canvas or image.
+    """
+
+    def __init__(self, measure, font, path=None):
+        self.measure = measure
+        self.font = font
+        self.path = path
+        # char -> advance, None for complex script characters
+        self.widths = {}
+        self.kerned = False
+        self.mismatches = 0
+        self.checks = 0
+        self.changed = False
+
+    def width(self, text):
+        if self.kerned:
+            return self.text_width(text)
+
+        widths = self.widths
+        try:
+            width = sum([widths[ch] for ch in text])
+        except KeyError:
+            return self.learn(text)
+        except TypeError:
+            # complex script characters have no own width
+            return self.text_width(text)
+
+        if self.checks < CHECK_TEXTS and len(text) > 1:
+            self.checks += 1
+            return self.check(text, width)
+        return width
+
+    def text_width(self, text):
+        return self.measure(text, self.font)[1]
+
+    def learn(self, text):
+        """ Measure new characters of text, returns width of text """
+        for ch in text:
+            if ch not in self.widths:
+                if is_complex(ch):
+                    self.widths[ch] = None
+                else:
+                    self.widths[ch] = self.text_width(ch)
+        self.changed = True
+
+        # kerning changes width of text with new characters
+        widths = [self.widths[ch] for ch in text]
+        if None in widths:
+            return self.text_width(text)
+        if len(text) > 1:
+            return self.check(text, sum(widths))
+        return sum(widths)
+
+    def check(self, text, width):
+        """ Compare width of text from advances with measured one,
+            returns the measured width
+        """
+        real_width = self.text_width(text)
+        if abs(width - real_width) > TOLERANCE:
+            self.mismatches += 1
+            if self.mismatches >= MAX_MISMATCHES:
+                self.kerned = True
+                self.changed = True
+        return real_width
+
+    def load(self):
+        """ Read cached widths, returns False if there is no cache """
+        if self.path is None:
+            return False
+        try:
+            cache_file = open(self.path, "rb")
+        except IOError:
+            return False
+        try:
+            data = cache_file.read()
+        finally:
+            cache_file.close()
+
+        try:
+            magic, version, kerned, glyphs_num = \
+                struct.unpack_from(HEADER_FMT, data, 0)
+        except struct.error:
+            return False
+        if (magic != MAGIC or version != VERSION or
+                len(data) != HEADER_SIZE + glyphs_num * GLYPH_SIZE):
+            return False
+
+        try:
+            glyphs = struct.unpack_from("<" + GLYPH_FMT[1:] * glyphs_num,
+                                        data, HEADER_SIZE)
+            widths = {}
+            for i in xrange(0, len(glyphs), 2):
+                width = glyphs[i + 1]
+                if width == COMPLEX_WIDTH:
+                    width = None
+                widths[unichr(glyphs[i])] = width
+        except (struct.error, ValueError):
+            # characters of wide build on narrow one
+            return False
+        self.kerned = bool(kerned)
+        self.widths.update(widths)
+        return True
+
+    def save(self):
+        """ Write widths into cache file if new ones were measured """
+        if self.path is None or not self.changed:
+            return False
+
+        data = [struct.pack(HEADER_FMT, MAGIC, VERSION, int(self.kerned),
+                            len(self.widths))]
+        try:
+            for ch, width in self.widths.items():
+                if width is None:
+                    width = COMPLEX_WIDTH
+                data.append(struct.pack(GLYPH_FMT, ord(ch), width))
+        except struct.error:
+            return False
+
+        try:
+            cache_file = open(self.path, "wb")
+            try:
+                cache_file.write("".join(data))
+            finally:
+                cache_file.close()
+        except IOError:
+            return False
+        self.changed = False
+        return True
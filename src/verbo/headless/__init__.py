@@ -0,0 +1,5 @@
+"""
+    In-memory implementation of PyS60 modules (e32, appuifw, graphics,
+    key_codes, e32dbm) for running Verbo under desktop Python.
+    Modules are installed by backend.use(backend.HEADLESS).
+"""
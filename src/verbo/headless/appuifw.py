@@ -0,0 +1,186 @@
+"""
+    Headless appuifw module. Dialogs (popup_menu, query, ...) take
+    answers from the answers list, filled by the driving script;
+    notes are collected into notes list.
+"""
+
+import fonts
+
+EEventKeyDown = 3
+EEventKeyUp = 2
+EEventKey = 1
+
+SCREEN_SIZES = {"portrait": (240, 320),
+                "landscape": (320, 240)}
+
+# prepared answers for popup_menu, query, selection_list, multi_query
+answers = []
+# notes shown to user: (text, type)
+notes = []
+
+
+def next_answer():
+    if answers:
+        return answers.pop(0)
+    return None
+
+
+class Application(object):
+
+    def __init__(self):
+        self.title = u""
+        self.body = None
+        self.menu = []
+        self.exit_key_handler = None
+        self.screen = "normal"
+        self.orientation = "portrait"
+        self.tabs = []
+        self.tab_handler = None
+        self.active_tab = 0
+
+    def set_tabs(self, tabs, cbk=None):
+        self.tabs = tabs
+        self.tab_handler = cbk
+
+    def activate_tab(self, idx):
+        self.active_tab = idx
+
+    def set_exit(self):
+        pass
+
+    def layout(self, layout_id):
+        return (self.size(), (0, 0))
+
+    def size(self):
+        return SCREEN_SIZES.get(self.orientation, SCREEN_SIZES["portrait"])
+
+    def full_name(self):
+        return u"verbo"
+
+    def select(self, title):
+        """ Call menu item with given title like user did it """
+        for item in self.menu:
+            if item[0] == title:
+                return item[1]()
+        raise KeyError(title)
+
+
+app = Application()
+
+
+class Body(object):
+
+    def __init__(self):
+        self.bindings = {}
+
+    def bind(self, key, cbk):
+        self.bindings[key] = cbk
+
+    def press(self, key):
+        """ Simulate key press """
+        cbk = self.bindings.get(key)
+        if cbk is not None:
+            cbk()
+
+
+class Canvas(Body):
+
+    def __init__(self, redraw_callback=None, event_callback=None,
+                 resize_callback=None):
+        Body.__init__(self)
+        self.redraw_callback = redraw_callback
+        self.event_callback = event_callback
+        self.resize_callback = resize_callback
+        self.ops = 0
+        self.pixels = 0
+        self.measures = 0
+
+    def size(self):
+        return app.size()
+    size = property(size)
+
+    def measure_text(self, text, font=None, maxwidth=-1, maxadvance=-1):
+        self.measures += 1
+        return fonts.measure_text(text, font)
+
+    def blit(self, image, target=(0, 0), source=None, mask=None, scale=0):
+        if source is None:
+            source = (0, 0, image.size[0], image.size[1])
+        x1, y1, x2, y2 = source
+        self.ops += 1
+        self.pixels += max(0, int(x2 - x1)) * max(0, int(y2 - y1))
+
+    def clear(self, fill=(255, 255, 255)):
+        self.ops += 1
+        self.pixels += self.size[0] * self.size[1]
+
+
+class Listbox(Body):
+
+    def __init__(self, items, cbk=None):
+        Body.__init__(self)
+        self.cbk = cbk
+        self.set_list(items)
+
+    def set_list(self, items, current=0):
+        self.items = items
+        self.selected = current
+
+    def current(self):
+        return self.selected
+
+    def select(self, idx):
+        """ Select item idx like user clicked it """
+        self.selected = idx
+        if self.cbk is not None:
+            self.cbk()
+
+
+class Text(Body):
+
+    def __init__(self, text=u""):
+        Body.__init__(self)
+        self.text = text
+
+    def get(self):
+        return self.text
+
+    def set(self, text):
+        self.text = text
+
+    def add(self, text):
+        self.text += text
+
+    def clear(self):
+        self.text = u""
+
+
+def note(text, note_type="info", global_note=0):
+    notes.append((text, note_type))
+
+
+def popup_menu(items, title=u""):
+    return next_answer()
+
+
+def selection_list(choices, search_field=0):
+    return next_answer()
+
+
+def multi_selection_list(choices, style="checkbox", search_field=0):
+    answer = next_answer()
+    if answer is None:
+        return ()
+    return answer
+
+
+def query(label, query_type, initial_value=None):
+    return next_answer()
+
+
+def multi_query(label1, label2):
+    return next_answer()
+
+
+def available_fonts():
+    return [u"normal", u"dense", u"title", u"symbol"]
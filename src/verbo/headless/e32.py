@@ -0,0 +1,64 @@
+"""
+    Headless e32 module.
+"""
+
+from simclock import clock
+
+s60_version_info = (3, 0)
+pys60_version = "headless"
+pys60_version_info = (2, 0, 0, "final", 0)
+DRIVES = [u"C:", u"E:"]
+
+
+def in_emulator():
+    return False
+
+
+def ao_sleep(interval, cbk=None):
+    if cbk is None:
+        clock.sleep(interval)
+    else:
+        clock.schedule(interval, cbk)
+
+
+def ao_yield():
+    clock.run_timers()
+
+
+def drive_list():
+    return list(DRIVES)
+
+
+def reset_inactivity():
+    pass
+
+
+class Ao_lock(object):
+    """ wait() doesn't block, there is nobody to signal it """
+
+    def __init__(self):
+        self.signaled = False
+
+    def wait(self):
+        clock.run_timers()
+        self.signaled = False
+
+    def signal(self):
+        self.signaled = True
+
+
+class Ao_timer(object):
+
+    def __init__(self):
+        self.timer_id = None
+
+    def after(self, interval, cbk=None):
+        if cbk is None:
+            clock.sleep(interval)
+        else:
+            self.timer_id = clock.schedule(interval, cbk)
+
+    def cancel(self):
+        if self.timer_id is not None:
+            clock.cancel(self.timer_id)
+            self.timer_id = None
@@ -0,0 +1,72 @@
+"""
+    Headless e32dbm module. Databases live in memory while process runs,
+    so reopening the same path gives the same data. Like the device
+    database it stores printable text only.
+"""
+
+databases = {}
+
+
+def open(path, flags="r"):
+    if "n" in flags or path not in databases:
+        if "c" not in flags and "n" not in flags and path not in databases:
+            raise IOError("no such database: %s" % path)
+        databases[path] = {}
+    return Database(databases[path])
+
+
+class Database(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.syncs = 0
+        # characters of keys and values written
+        self.written = 0
+        self.closed = False
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        for text in (key, value):
+            for ch in text:
+                if ch < u" ":
+                    raise ValueError("control character in %r" % text)
+        self.written += len(key) + len(value)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data.keys())
+
+    def has_key(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def keys(self):
+        return self.data.keys()
+
+    def values(self):
+        return self.data.values()
+
+    def items(self):
+        return self.data.items()
+
+    def sync(self):
+        self.syncs += 1
+
+    def reorganize(self):
+        pass
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,34 @@
+"""
+    Fake font metrics for headless backend.
+"""
+
+NARROW = u"iljtfr.,:;!|'` "
+WIDE = u"mwMW"
+
+
+def font_size(font):
+    if isinstance(font, tuple) and len(font) > 1 and font[1]:
+        return font[1]
+    return 12
+
+
+def char_width(ch, size):
+    """ Integer advance like bitmap fonts have """
+    if ch in NARROW:
+        scale = 0.3
+    elif ch in WIDE:
+        scale = 0.85
+    elif ch.isupper():
+        scale = 0.7
+    else:
+        scale = 0.55
+    return int(size * scale + 0.5)
+
+
+def measure_text(text, font=None):
+    """ Same result format as Canvas.measure_text on device:
+        ((left, top, right, bottom), x_advance, chars_fitted)
+    """
+    size = font_size(font)
+    width = sum([char_width(ch, size) for ch in text])
+    return ((0, -size, width, size / 4), width, len(text))
@@ -0,0 +1,58 @@
+"""
+    Headless graphics module. Images keep no pixels, only counters of
+    drawing operations and touched pixels.
+"""
+
+import fonts
+
+
+def rect_area(rect):
+    x1, y1, x2, y2 = rect
+    return max(0, int(x2 - x1)) * max(0, int(y2 - y1))
+
+
+class Image(object):
+
+    def __init__(self, size, mode="RGB16"):
+        self.size = tuple(size)
+        self.mode = mode
+        self.ops = 0
+        self.pixels = 0
+
+    def new(size, mode="RGB16"):
+        return Image(size, mode)
+    new = staticmethod(new)
+
+    def full_rect(self):
+        return (0, 0, self.size[0], self.size[1])
+
+    def clear(self, fill=(255, 255, 255)):
+        self.ops += 1
+        self.pixels += rect_area(self.full_rect())
+
+    def line(self, coords, outline=None, width=1, fill=None):
+        x1, y1, x2, y2 = coords[:4]
+        self.ops += 1
+        self.pixels += int(max(abs(x2 - x1), abs(y2 - y1)) + 1) * width
+
+    def rectangle(self, coords, outline=None, width=1, fill=None):
+        self.ops += 1
+        self.pixels += rect_area(coords)
+
+    def text(self, coords, text, fill=None, font=None):
+        (left, top, right, bottom), advance, chars = fonts.measure_text(text,
+                                                                        font)
+        self.ops += 1
+        self.pixels += rect_area((left, top, right, bottom))
+
+    def measure_text(self, text, font=None, maxwidth=-1, maxadvance=-1):
+        return fonts.measure_text(text, font)
+
+    def blit(self, image, target=(0, 0), source=None, mask=None, scale=0):
+        if source is None:
+            source = image.full_rect()
+        self.ops += 1
+        self.pixels += rect_area(source)
+
+    def resize(self, size, callback=None, keepaspect=0):
+        return Image(size, self.mode)
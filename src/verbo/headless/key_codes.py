@@ -0,0 +1,26 @@
+"""
+    Headless key_codes module, values are the same as on device.
+"""
+
+EKeyLeftArrow = 0xf807
+EKeyRightArrow = 0xf808
+EKeyUpArrow = 0xf809
+EKeyDownArrow = 0xf80a
+EKeySelect = 0xf845
+EKeyBackspace = 0x8
+EKeyStar = 0x2a
+EKeyHash = 0x23
+
+EScancodeLeftArrow = 0x0e
+EScancodeRightArrow = 0x0f
+EScancodeUpArrow = 0x10
+EScancodeDownArrow = 0x11
+EScancodeSelect = 0xa7
+EScancodeStar = 0x2a
+EScancodeHash = 0x7f
+
+# EKey0..EKey9 and EScancode0..EScancode9
+for _i in range(10):
+    globals()["EKey%d" % _i] = 0x30 + _i
+    globals()["EScancode%d" % _i] = 0x30 + _i
+del _i
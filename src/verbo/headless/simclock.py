@@ -0,0 +1,59 @@
+"""
+    Simulated time for headless backend.
+"""
+
+import time
+import heapq
+
+
+class SimClock(object):
+    """ Clock advanced by e32.ao_sleep instead of real sleeping.
+        Timers (e32.Ao_timer, ao_sleep with callback) fire in order
+        when simulated time passes their moment.
+        With realtime=True real elapsed time is added too, so time spent
+        in code is visible while sleeps are still free.
+    """
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.reset()
+
+    def reset(self):
+        self.slept = 0.
+        self.start = time.time()
+        self.timers = []
+        self.timer_seq = 0
+
+    def now(self):
+        if self.realtime:
+            return self.slept + time.time() - self.start
+        return self.slept
+
+    def schedule(self, delay, cbk):
+        """ Call cbk after delay seconds of simulated time. Returns timer id """
+        self.timer_seq += 1
+        heapq.heappush(self.timers, (self.now() + delay, self.timer_seq, cbk))
+        return self.timer_seq
+
+    def cancel(self, timer_id):
+        self.timers = [t for t in self.timers if t[1] != timer_id]
+        heapq.heapify(self.timers)
+
+    def sleep(self, delay):
+        """ Pass delay seconds running due timers """
+        wake_time = self.now() + max(delay, 0)
+        self.run_timers(wake_time)
+        if self.now() < wake_time:
+            self.slept += wake_time - self.now()
+
+    def run_timers(self, until=None):
+        if until is None:
+            until = self.now()
+        while self.timers and self.timers[0][0] <= until:
+            when, seq, cbk = heapq.heappop(self.timers)
+            if self.now() < when:
+                self.slept += when - self.now()
+            cbk()
+
+
+clock = SimClock()
@@ -1,48 +1,471 @@
+import os
+import time
+import bisect
+import e32
 import e32dbm
 
 
+class BookRecord(object):
+    """ Library entry of the book. Stored in db as printable unicode
+        string: MARK, fixed width hex fields (HEADER_FMT) and the title.
+        Old "title,pos" records are recognized and converted by
+        LibManager.migrate().
+    """
+    VERSION = 1
+    MARK = u"@"
+    # version, format, pos, words, size, mtime, opened
+    HEADER_FMT = u"%02x%02x%08x%08x%08x%08x%08x"
+    FIELDS = (2, 2, 8, 8, 8, 8, 8)
+    HEADER_LEN = len(MARK) + sum(FIELDS)
+    FORMATS = {"txt": 1, "fb2": 2}
+
+    def __init__(self, title, pos=0, words=0, size=0, mtime=0, opened=0,
+                 book_format=0):
+        self.title = title
+        self.pos = pos
+        self.words = words
+        self.size = size
+        self.mtime = mtime
+        self.opened = opened
+        self.book_format = book_format
+
+    def for_file(title, path, pos=0):
+        """ New record with format, size and mtime of the book file """
+        record = BookRecord(title, pos)
+        record.book_format = BookRecord.FORMATS.get(path.split(".")[-1], 0)
+        try:
+            st = os.stat(path.encode("utf-8"))
+            record.size = st.st_size
+            record.mtime = int(st.st_mtime)
+        except OSError:
+            pass
+        return record
+    for_file = staticmethod(for_file)
+
+    def encode(self):
+        fields = [BookRecord.VERSION, self.book_format, self.pos, self.words,
+                  self.size, self.mtime, self.opened]
+        # fields have fixed width
+        for i in xrange(1, len(fields)):
+            fields[i] = max(0, min(fields[i],
+                                   16 ** BookRecord.FIELDS[i] - 1))
+        return BookRecord.MARK + BookRecord.HEADER_FMT % tuple(fields) + \
+               self.title
+
+    def decode(data):
+        if not BookRecord.is_old(data):
+            fields = []
+            pos = len(BookRecord.MARK)
+            for width in BookRecord.FIELDS:
+                fields.append(int(data[pos:pos+width], 16))
+                pos += width
+            return BookRecord(data[BookRecord.HEADER_LEN:], fields[2],
+                              fields[3], fields[4], fields[5], fields[6],
+                              fields[1])
+
+        # old "title,pos" record, title may contain commas
+        title, pos = data.rsplit(u",", 1)
+        return BookRecord(title, int(pos))
+    decode = staticmethod(decode)
+
+    def is_old(data):
+        """ Check if data is a "title,pos" record """
+        if len(data) < BookRecord.HEADER_LEN or \
+                not data.startswith(BookRecord.MARK):
+            return True
+        try:
+            int(data[len(BookRecord.MARK):BookRecord.HEADER_LEN], 16)
+        except ValueError:
+            return True
+        return False
+    is_old = staticmethod(is_old)
+
+
+# db keys of library service data start with it, paths can't
+RESERVED_PREFIX = u"*"
+ORDER_TITLE = "title"
+ORDER_RECENT = "recent"
+
+
+class SortedIndex(object):
+    """ Paths of books sorted by key. Saved in db in pages of sorted
+        entries, every page under its own reserved key, and directory
+        of page ids in order under db_key. Change of one book rewrites
+        only its page, and directory when pages are split or removed.
+        Entry is "%x|" % len(key), key and path ended by ">", which
+        can't be a part of path.
+    """
+    # page is split in two when it gets more entries
+    MAX_PAGE = 64
+
+    def __init__(self, name, key_func):
+        self.db_key = RESERVED_PREFIX + name
+        self.key_func = key_func
+        # [keys, paths] of pages in order
+        self.pages = []
+        self.page_ids = []
+        self.next_id = 0
+        self.count = 0
+        # ids of pages changed or removed since the last dump()
+        self.changed_pages = {}
+        self.removed_pages = []
+        self.dir_changed = False
+
+    def __len__(self):
+        return self.count
+
+    def page_key(self, page_id):
+        return u"%s/%x" % (self.db_key, page_id)
+
+    def load(self, get_data):
+        """ Read pages, get_data returns value of db key or None """
+        data = get_data(self.db_key)
+        if not data:
+            return
+        ids = [int(page_id, 16) for page_id in data.split(u" ")]
+        self.next_id = ids[0]
+        for page_id in ids[1:]:
+            keys = []
+            paths = []
+            data = get_data(self.page_key(page_id)) or u""
+            pos = 0
+            while pos < len(data):
+                sep = data.index(u"|", pos)
+                key_end = sep + 1 + int(data[pos:sep], 16)
+                end = data.index(u">", key_end)
+                keys.append(data[sep+1:key_end])
+                paths.append(data[key_end:end])
+                pos = end + 1
+            if keys:
+                self.pages.append([keys, paths])
+                self.page_ids.append(page_id)
+                self.count += len(keys)
+
+    def dump(self):
+        """ Returns db key -> value (None for removed keys) of pages
+            changed since the last dump()
+        """
+        data = {}
+        for page_id in self.removed_pages:
+            data[self.page_key(page_id)] = None
+        for page_id, (keys, paths) in zip(self.page_ids, self.pages):
+            if page_id in self.changed_pages:
+                data[self.page_key(page_id)] = u"".join(
+                    [u"%x|%s%s>" % (len(key), key, path)
+                     for key, path in zip(keys, paths)])
+        if self.dir_changed:
+            data[self.db_key] = u" ".join([u"%x" % page_id for page_id in
+                                           [self.next_id] + self.page_ids])
+        self.changed_pages = {}
+        self.removed_pages = []
+        self.dir_changed = False
+        return data
+
+    def record_key(self, record):
+        # db values can't have control characters
+        key = self.key_func(record)
+        for ch in key:
+            if ch < u" ":
+                return u"".join([ch < u" " and u" " or ch for ch in key])
+        return key
+
+    def find_page(self, key):
+        """ Returns index of the first page which can contain key """
+        # the first page can be empty, its first key isn't needed
+        firsts = [keys[0] for keys, paths in self.pages[1:]]
+        return bisect.bisect_left(firsts, key)
+
+    def add(self, path, record):
+        key = self.record_key(record)
+        if not self.pages:
+            self.pages.append([[], []])
+            self.page_ids.append(self.next_id)
+            self.next_id += 1
+            self.dir_changed = True
+
+        page = self.find_page(key)
+        keys, paths = self.pages[page]
+        idx = bisect.bisect(keys, key)
+        keys.insert(idx, key)
+        paths.insert(idx, path)
+        self.count += 1
+        self.changed_pages[self.page_ids[page]] = True
+
+        if len(keys) > SortedIndex.MAX_PAGE:
+            half = len(keys) // 2
+            self.pages.insert(page + 1, [keys[half:], paths[half:]])
+            del keys[half:]
+            del paths[half:]
+            self.page_ids.insert(page + 1, self.next_id)
+            self.changed_pages[self.next_id] = True
+            self.next_id += 1
+            self.dir_changed = True
+
+    def remove(self, path, record):
+        key = self.record_key(record)
+        page = self.find_page(key)
+        # equal keys can continue on the next pages
+        while page < len(self.pages):
+            keys, paths = self.pages[page]
+            idx = bisect.bisect_left(keys, key)
+            while idx < len(keys) and keys[idx] == key:
+                if paths[idx] == path:
+                    del keys[idx]
+                    del paths[idx]
+                    self.count -= 1
+                    self.remove_page(page)
+                    return
+                idx += 1
+            if idx < len(keys):
+                return
+            page += 1
+
+    def remove_page(self, page):
+        """ Mark page changed, empty page is removed """
+        page_id = self.page_ids[page]
+        if self.pages[page][0]:
+            self.changed_pages[page_id] = True
+            return
+        del self.pages[page]
+        del self.page_ids[page]
+        self.changed_pages.pop(page_id, None)
+        self.removed_pages.append(page_id)
+        self.dir_changed = True
+
+    def slice(self, start, end):
+        """ Returns paths of entries from start to end """
+        paths = []
+        first = 0
+        for keys, page_paths in self.pages:
+            if first >= end:
+                break
+            last = first + len(keys)
+            if last > start:
+                paths.extend(page_paths[max(0, start - first):end - first])
+            first = last
+        return paths
+
+    def window(self, offset=0, limit=None, reverse=False):
+        """ Returns paths from offset, at most limit of them """
+        if limit is None:
+            limit = self.count
+        if not reverse:
+            return self.slice(offset, offset + limit)
+
+        end = self.count - offset
+        paths = self.slice(max(0, end - limit), max(0, end))
+        paths.reverse()
+        return paths
+
+
 class LibManager(object):
     DB_PATH = u""
+    # library format, older libraries are migrated on open
+    VERSION = 1
+    VERSION_KEY = RESERVED_PREFIX + u"version"
+    # changed books kept in memory before they are written to db
+    MAX_DIRTY = 256
+    # seconds before changed books are written to db
+    FLUSH_INTERVAL = 30
 
     def __init__(self, db_path):
         LibManager.DB_PATH = db_path
         self.db = e32dbm.open(LibManager.DB_PATH, "cf")
+        # path -> data of changed books, None for removed ones
+        self.dirty = {}
+        self.batch_level = 0
+        self.flush_timer = e32.Ao_timer()
+        self.timer_active = False
+        self.indexes = {
+            ORDER_TITLE: SortedIndex(u"by-title",
+                                     lambda record: record.title.lower()),
+            ORDER_RECENT: SortedIndex(u"by-opened",
+                                      lambda record: u"%010d" % record.opened)}
+        self.migrate()
 
     def __del__(self):
+        self.close()
+
+    def close(self):
+        """ Write all changes and close db """
+        if self.db is None:
+            return
+        self.flush()
         self.db.close()
+        self.db = None
 
-    def add_book(self, title, path, pos=0):
+    def begin(self):
+        """ Start batch of changes. Changes are written to db by
+            one sync on commit() of the outermost batch.
+            Batches can be used with "with" statement as well.
+        """
+        self.batch_level += 1
+
+    def commit(self):
+        if self.batch_level <= 0:
+            raise ValueError("commit() without begin()")
+        self.batch_level -= 1
+        if self.batch_level == 0:
+            self.flush()
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.commit()
+        return False
+
+    def flush(self):
+        """ Write changed books into db """
+        if self.timer_active:
+            self.flush_timer.cancel()
+            self.timer_active = False
+
+        for index in self.indexes.values():
+            self.dirty.update(index.dump())
+
+        if not self.dirty:
+            return
+
+        for path, data in self.dirty.items():
+            if data is not None:
+                self.db[path] = data
+            elif path in self.db:
+                del self.db[path]
+        self.db.sync()
+        self.dirty.clear()
+
+    def write(self, path, data):
+        """ Remember change of the book, db is updated later """
+        self.dirty[path] = data
+
+        # dirty set is bounded even inside batch
+        if len(self.dirty) >= LibManager.MAX_DIRTY:
+            self.flush()
+        elif not self.timer_active and not self.batch_level:
+            self.timer_active = True
+            self.flush_timer.after(LibManager.FLUSH_INTERVAL, self.on_timer)
+
+    def on_timer(self):
+        self.timer_active = False
+        if not self.batch_level:
+            self.flush()
+
+    def migrate(self):
+        """ Convert "title,pos" records of library without version
+            and build its indexes.
+        """
+        version = self.get_data(LibManager.VERSION_KEY)
+        if version is not None and int(version) >= LibManager.VERSION:
+            for index in self.indexes.values():
+                index.load(self.get_data)
+            return
+
+        self.begin()
+        for path, data in self.items():
+            record = BookRecord.decode(data)
+            if BookRecord.is_old(data):
+                record = BookRecord.for_file(record.title, path, record.pos)
+                self.write(path, record.encode())
+            for index in self.indexes.values():
+                index.add(path, record)
+        self.write(LibManager.VERSION_KEY, unicode(LibManager.VERSION))
+        self.commit()
+
+    def get_data(self, path):
+        """ Returns data of the book or None if there is no such book """
+        if path in self.dirty:
+            return self.dirty[path]
+        if path in self.db:
+            return self.db[path]
+        return None
+
+    def items(self):
+        """ Returns (path, data) for each book """
+        items = [(path, data) for path, data in self.db.items()
+                 if path not in self.dirty]
+        items.extend([(path, data) for path, data in self.dirty.items()
+                      if data is not None])
+        return [(path, data) for path, data in items
+                if not path.startswith(RESERVED_PREFIX)]
+
+    def store(self, path, record):
+        """ Save record of the book updating indexes """
+        old_data = self.get_data(path)
+        old_record = None
+        if old_data is not None:
+            old_record = BookRecord.decode(old_data)
+        for index in self.indexes.values():
+            # page of index isn't rewritten if the book keeps its place
+            if old_record is not None and record is not None and \
+                    index.key_func(old_record) == index.key_func(record):
+                continue
+            if old_record is not None:
+                index.remove(path, old_record)
+            if record is not None:
+                index.add(path, record)
+
+        if record is None:
+            self.write(path, None)
+        else:
+            self.write(path, record.encode())
+
+    def add_book(self, title, path, pos=0, words=0):
         """ Check new book path in app cache (self.books).
             And if it not exists, add it.
             Args:
                 title (unicode): book title
                 path (unicode): full book path in filesystem
                 pos (int): last reading position
+                words (int): number of words, may be estimated
             Returns:
                 True or False depend on existing path in database
         """
         # lib can't contains books with the same path
-        if path in self.db:
+        if self.get_data(path) is not None:
             return False
 
         # add it into db
-        self.db[path] = u"%s,%s" % (title, unicode(pos))
-        self.db.sync()
+        record = BookRecord.for_file(title, path, pos)
+        record.words = words
+        self.store(path, record)
 
         return True
 
-    def update_book(self, path, title, pos):
-        self.db[path] = u"%s,%s" % (title, unicode(pos))
-        self.db.sync()
+    def update_book(self, path, title, pos, words=None):
+        """ Save reading position, it also marks book as just opened """
+        record = self.get_book(path)
+        if record is None:
+            record = BookRecord.for_file(title, path)
+        record.title = title
+        record.pos = pos
+        record.opened = int(time.time())
+        if words is not None:
+            record.words = words
+        self.store(path, record)
 
     def remove_book(self, path):
-        del self.db[path]
-        self.db.sync()
+        self.store(path, None)
 
-    def get_books(self):
-        """ Returns info for each book in library """
-        return [(unicode(data.split(",")[0]), unicode(path))
-                for path, data in self.db.items()]
+    def get_book(self, path):
+        """ Returns BookRecord of the book or None """
+        data = self.get_data(path)
+        if data is None:
+            return None
+        return BookRecord.decode(data)
+
+    def count(self):
+        return len(self.indexes[ORDER_TITLE])
+
+    def get_books(self, offset=0, limit=None, order=ORDER_TITLE):
+        """ Returns (title, path) for books of library sorted by order
+            (ORDER_TITLE or ORDER_RECENT), at most limit books
+            starting from offset.
+        """
+        paths = self.indexes[order].window(offset, limit,
+                                           order == ORDER_RECENT)
+        return [(self.get_book(path).title, unicode(path)) for path in paths]
 
     def get_bookpos(self, path):
-        return int(self.db[path].split(",")[-1])
+        return self.get_book(path).pos
@@ -1,19 +1,39 @@
 import key_codes
 import appuifw
-import codecs
+import bisect
 import e32
 
 from window import Dialog
 from draw import Draw
 from fb2parser import FB2Parser
+from wordstore import WordStore, PARA_END
+from wordmeta import WordMeta, DELAY_UNIT
+from chunks import ChunkIndex, WordFrames
+import bookindex
+import scheduler
+import backend
+import boundaries
+import searchindex
 
 class Reader(Dialog):
 
-    PUNCT_MARKS = (",", ".", "-", ":", "?", "!")
+    FRAME_POLICY = scheduler.CATCH_UP
+    # words tokenized before the first frame, counting from last position
+    FIRST_WORDS = 200
+    # words tokenized by one background step
+    LOAD_BATCH = 1000
+    # frames of next words rendered ahead after every shown word
+    PRERENDER_STEP = 2
+    MAX_WPM = 1000
+    # chunk frames last at least two word delays (chunks.MIN_DELAY)
+    MAX_CHUNK_WPM = 2000
 
     def __init__(self, cbk, book_title, book_path, last_pos):
         menu = [(u"Start", self.reader_start),
                 (u"Pause", self.reader_pause),
+                (u"Search", self.search),
+                (u"Find next", self.find_next),
+                (u"Chunk mode", self.toggle_chunks),
                 (u"Close book", self.close_reader)]
 
         self.book_title = book_title
@@ -22,9 +42,19 @@ class Reader(Dialog):
         self.currword_idx = last_pos
         self.wpm = 250
         self.init_delay()
-        self.words = []
+        self.scheduler = scheduler.DeadlineScheduler(e32.ao_sleep,
+                                                     backend.clock,
+                                                     Reader.FRAME_POLICY)
+        self.words = WordStore()
         self.words_num = 0
+        self.search_index = None
+        self.search_query = u""
+        self.search_hits = []
+        self.load_timer = e32.Ao_timer()
+        self.has_chapter_menu = False
         self.parse_words()
+        self.chunk_mode = False
+        self.set_frames()
 
         self.old_orientation = appuifw.app.orientation
         appuifw.app.orientation = "landscape"
@@ -37,35 +67,200 @@ class Reader(Dialog):
                         menu,
                         self.close_reader)
 
+        self.load_words(last_pos + Reader.FIRST_WORDS - len(self.words))
+        # resume reading from the start of sentence
+        self.currword_idx = boundaries.current_start(
+            self.words.sentences, min(last_pos, self.words_num))
+        self.add_chapter_menu()
         self.reader_pause()
+        if self.loader is not None:
+            self.load_timer.after(0, self.load_step)
 
     def init_delay(self):
         self.word_delay = 60. / self.wpm
-        self.punct_delay = self.word_delay * 2
+        # word delay is multiplied by per word multiplier in this units
+        self.word_unit = self.word_delay / DELAY_UNIT
+        # speed achieved by previous reading, unknown for new delays
+        self.real_wpm = 0
 
     def parse_words(self):
-        """ Parse words from book into self.word """
+        """ Start loading words of the book into self.words.
+            Words of already parsed book are taken from its index.
+            Otherwise book is tokenized progressively by load_words(),
+            words around the last position first and the rest in
+            background, so self.words_num grows while loading.
+            Loading of txt book closed before it was loaded is resumed
+            after words of its partial index.
+        """
+        self.parser = None
+        self.loader = None
+        self.writer = None
+        self.complete = True
+        # (byte offset of line, words before in line) of first words
+        # of index blocks, partial index is saved with it
+        self.block_pos = {}
+        index = bookindex.open_index(self.book_path)
         book_ext = self.book_path.split(".")[-1]
-
-        if book_ext == "txt":
-            self.parse_txt()
-        elif book_ext == "fb2":
-            self.parse_fb2()
+        partial = None
+        if index is None and book_ext == "txt":
+            partial = bookindex.open_index(self.book_path, True)
+
+        if index is not None:
+            self.words = index
+        elif partial is not None:
+            self.words = bookindex.ResumedWords(partial)
+            self.complete = False
+            self.writer = bookindex.resume_writer(partial)
+            self.loader = self.iter_txt(partial.resume_offset,
+                                        partial.resume_skip)
+        else:
+            self.words = WordStore()
+            self.words.meta = WordMeta()
+            self.words.chunks = ChunkIndex()
+            self.complete = False
+            # index is written while book is tokenized
+            self.writer = bookindex.create_writer(self.book_path)
+
+            if book_ext == "txt":
+                self.loader = self.iter_txt()
+            elif book_ext == "fb2":
+                self.parser = FB2Parser(self.book_path)
+                self.loader = self.parser.iter_tokens()
 
         self.words_num = len(self.words)-1
 
-    def parse_txt(self):
-        book_file = codecs.open(self.book_path, "r", "utf-8")
-
-        for line in book_file:
-            for w in line.split():
-                self.words.append(w)
-
-        book_file.close()
-
-    def parse_fb2(self):
-        fb2 = FB2Parser(self.book_path)
-        self.words = fb2.parse_words()
+    def loaded(self):
+        """ True if all words of the book are loaded """
+        return self.complete
+
+    def load_words(self, count):
+        """ Tokenize next count words of the book.
+            Returns number of loaded words.
+        """
+        if self.loader is None:
+            return 0
+
+        words = self.words
+        loaded = 0
+        try:
+            while loaded < count:
+                word, flags = self.loader.next()
+                if word is None:
+                    words.mark(flags)
+                else:
+                    words.append(word, flags)
+                    loaded += 1
+        except StopIteration:
+            self.loader = None
+
+        words.meta.update(words)
+        words.chunks.update(words, self.loader is None)
+        if self.parser is not None:
+            words.chapters = self.parser.chapters
+        self.words_num = len(words)-1
+        if self.writer is not None and \
+                not self.writer.write_words(words, self.words_num):
+            self.writer = None
+
+        if self.loader is None:
+            # book is loaded completely, the rest of index is written
+            # on pause by save_index(), so it doesn't delay frames
+            self.complete = True
+            self.parser = None
+            self.add_chapter_menu()
+
+        return loaded
+
+    def save_index(self):
+        """ Finish index of just loaded book and read words from it """
+        if self.writer is None or not self.complete:
+            return
+        writer = self.writer
+        self.writer = None
+        if writer.finish(self.words):
+            self.use_index()
+
+    def suspend_index(self):
+        """ Keep written blocks of book which isn't loaded, so loading
+            is resumed after them next time. Without position of the
+            next word (fb2) index is written again.
+        """
+        writer = self.writer
+        resume = self.block_pos.get(writer.words_num)
+        if resume is None or not writer.words_num:
+            writer.abort()
+        else:
+            writer.suspend(self.words, resume)
+
+    def use_index(self):
+        """ Take words from just written index instead of memory,
+            so only pages of words around position are kept.
+        """
+        index = bookindex.open_index(self.book_path)
+        if index is None:
+            return
+        # words in memory are freed when reading loop is done with them
+        self.words = index
+        self.set_frames()
+
+    def load_step(self):
+        """ Background loading, runs when UI is idle """
+        if self.cancel or self.loader is None:
+            return
+        self.load_words(Reader.LOAD_BATCH)
+        if self.loader is not None:
+            self.load_timer.after(0, self.load_step)
+        elif self.pause:
+            self.save_index()
+
+    def finish_loading(self):
+        while self.loader is not None:
+            self.load_words(Reader.LOAD_BATCH)
+
+    def add_chapter_menu(self):
+        if self.has_chapter_menu or not self.words.chapters:
+            return
+
+        self.has_chapter_menu = True
+        self.global_menu[4:4] = [
+            (u"Go to chapter", self.goto_chapter),
+            (u"Next chapter", lambda: self.change_chapter(1)),
+            (u"Previous chapter", lambda: self.change_chapter(-1))]
+        if appuifw.app.body is self.draw.canvas:
+            appuifw.app.menu = self.global_menu
+
+    def iter_txt(self, offset=0, skip=0):
+        """ Yields (word, flags) of txt book, word is None when
+            flags should be set on the previous word. Book is read
+            from the line at byte offset without its first skip words.
+            Positions of words starting index blocks go to block_pos.
+        """
+        page_words = bookindex.PAGE_WORDS
+        # index of the next word and of the next block start
+        idx = len(self.words)
+        block = (idx + page_words - 1) // page_words * page_words
+        book_file = open(self.book_path, "rb")
+        try:
+            book_file.seek(offset)
+            for line in book_file:
+                words = line.decode("utf-8").split()
+                # blank line ends paragraph
+                if not words:
+                    yield None, PARA_END
+                end = idx + len(words) - skip
+                while block < end:
+                    self.block_pos[block] = (offset, skip + block - idx)
+                    block += page_words
+                offset += len(line)
+                if skip:
+                    words = words[skip:]
+                    skip = 0
+                for w in words:
+                    yield w, 0
+                idx = end
+            yield None, PARA_END
+        finally:
+            book_file.close()
 
     def reader_start(self):
         self.pause = False
@@ -75,6 +270,10 @@ class Reader(Dialog):
         self.draw.canvas.bind(key_codes.EScancode4, lambda: None)
         self.draw.canvas.bind(key_codes.EScancode7, lambda: None)
         self.draw.canvas.bind(key_codes.EScancode9, lambda: None)
+        self.draw.canvas.bind(key_codes.EScancode1, lambda: None)
+        self.draw.canvas.bind(key_codes.EScancode3, lambda: None)
+        self.draw.canvas.bind(key_codes.EScancode2, lambda: None)
+        self.draw.canvas.bind(key_codes.EScancode8, lambda: None)
         self.draw.canvas.bind(key_codes.EScancodeStar, lambda: None)
         self.draw.canvas.bind(key_codes.EScancodeHash, lambda: None)
         self.start_reading()
@@ -83,18 +282,30 @@ class Reader(Dialog):
         self.pause = True
         self.draw.canvas.bind(key_codes.EScancode5, self.reader_start)
         # enable rewind when pause
-        self.draw.canvas.bind(key_codes.EScancode6, lambda: self.rewind(-1))
-        self.draw.canvas.bind(key_codes.EScancode4, lambda: self.rewind(1))
-        self.draw.canvas.bind(key_codes.EScancode7, lambda: self.rewind(10))
-        self.draw.canvas.bind(key_codes.EScancode9, lambda: self.rewind(-10))
+        self.draw.canvas.bind(key_codes.EScancode6, lambda: self.step(-1))
+        self.draw.canvas.bind(key_codes.EScancode4, lambda: self.step(1))
+        self.draw.canvas.bind(key_codes.EScancode7, lambda: self.step(10))
+        self.draw.canvas.bind(key_codes.EScancode9, lambda: self.step(-10))
+        self.draw.canvas.bind(key_codes.EScancode1,
+                              lambda: self.seek(self.words.sentences, -1))
+        self.draw.canvas.bind(key_codes.EScancode3,
+                              lambda: self.seek(self.words.sentences, 1))
+        self.draw.canvas.bind(key_codes.EScancode2,
+                              lambda: self.seek(self.words.paragraphs, -1))
+        self.draw.canvas.bind(key_codes.EScancode8,
+                              lambda: self.seek(self.words.paragraphs, 1))
         self.draw.canvas.bind(key_codes.EScancodeStar, self.inc_wpm)
         # EScancodeHash doesn't work?
         self.draw.canvas.bind(key_codes.EKeyHash, self.dec_wpm)
+        self.save_index()
         self.display_scene()
 
     def inc_wpm(self):
         new_wpm = self.wpm + 50
-        if new_wpm <= 1000:
+        max_wpm = Reader.MAX_WPM
+        if self.chunk_mode:
+            max_wpm = Reader.MAX_CHUNK_WPM
+        if new_wpm <= max_wpm:
             self.wpm = new_wpm
             self.init_delay()
             self.display_scene()
@@ -116,62 +327,180 @@ class Reader(Dialog):
         elif new_idx > self.words_num:
             self.currword_idx = self.words_num
 
+        if offset < 0:
+            self.words.prefetch(self.currword_idx, -1)
+        else:
+            self.words.prefetch(self.currword_idx)
         self.display_scene()
 
-    def display_scene(self):
-        word = self.words[self.currword_idx]
-        best_letter = self.best_letter_pos(word)
+    def step(self, offset):
+        """ Move by offset frames (words or chunks) """
+        frames = self.frames
+        frame = frames.find(self.currword_idx) + offset
+        frame = max(0, min(frame, frames.ready() - 1))
+        self.rewind(frames.start(frame) - self.currword_idx)
+
+    def toggle_chunks(self):
+        """ Switch between showing single words and chunks of words """
+        self.chunk_mode = not self.chunk_mode
+        self.set_frames()
+        if not self.chunk_mode:
+            if self.wpm > Reader.MAX_WPM:
+                self.wpm = Reader.MAX_WPM
+                self.init_delay()
+        # pre-rendered frames are numbered by frames of previous mode
+        self.draw.invalidate_frames()
+        self.display_scene()
 
-        self.draw.clear()
-        self.draw.word(word, best_letter)
-        if self.pause:
-            self.draw.info(self.wpm)
-        self.draw.redraw()
-
-    def best_letter_pos(self, word):
-        """ Primitive algorithm for defining focus letter """
-        word_len = len(word)
-        best_letter = 0
-
-        if word_len == 1:
-            best_letter = 0
-        elif word_len >= 2 and word_len <= 5:
-            best_letter = 1
-        elif word_len >= 6 and word_len <= 9:
-            best_letter = 2
-        elif word_len >= 10 and word_len <= 13:
-            best_letter = 3
+    def set_frames(self):
+        if self.chunk_mode:
+            self.frames = self.words.chunks
+        else:
+            self.frames = WordFrames(self.words)
+
+    def seek(self, starts, direction):
+        """ Go to previous (direction < 0) or next start of sentence
+            or paragraph from sorted starts.
+        """
+        if direction < 0:
+            new_idx = boundaries.prev_start(starts, self.currword_idx)
         else:
-            best_letter = 4
+            new_idx = boundaries.next_start(starts, self.currword_idx,
+                                            self.words_num)
+        self.rewind(new_idx - self.currword_idx)
+
+    def goto_chapter(self):
+        chapters = self.words.chapters
+        idx = appuifw.popup_menu(chapters.menu_items(), u"Go to chapter:")
+        if idx is not None:
+            self.rewind(chapters.starts[idx] - self.currword_idx)
+
+    def change_chapter(self, offset):
+        chapters = self.words.chapters
+        idx = chapters.find(self.currword_idx) + offset
+        idx = max(0, min(idx, len(chapters) - 1))
+        self.rewind(chapters.starts[idx] - self.currword_idx)
+
+    def search(self):
+        """ Ask for word or phrase and go to its next occurrence.
+            Search index is built on the first search.
+        """
+        query = appuifw.query(u"Search:", "text", self.search_query)
+        if not query:
+            return
+
+        if self.search_index is None:
+            self.search_index = searchindex.open_index(self.book_path)
+        if self.search_index is None:
+            self.set_title(u"Indexing...")
+            self.finish_loading()
+            self.search_index = searchindex.build_index(self.book_path,
+                                                        self.words)
+            self.set_title(self.book_title)
+
+        if query != self.search_query:
+            self.search_query = query
+            self.search_hits = self.search_index.search(query)
+        self.find_next()
+
+    def find_next(self):
+        if not self.search_hits:
+            appuifw.note(u"Not found", "info")
+            return
+
+        idx = bisect.bisect_right(self.search_hits, self.currword_idx)
+        if idx == len(self.search_hits):
+            # continue from the beginning
+            idx = 0
+        self.rewind(self.search_hits[idx] - self.currword_idx)
 
-        return best_letter
+    def display_scene(self):
+        frames = self.frames
+        frame = frames.find(self.currword_idx)
 
-    def check_punct(self, word):
-        if word[-1] in Reader.PUNCT_MARKS:
-            return True
-        return False
+        self.draw.erase()
+        if not self.draw.show_frame(frame):
+            self.draw.word(frames.text(frame), frames.focus[frame])
+        if self.pause:
+            self.draw.info(self.wpm, self.real_wpm, self.progress())
+        self.draw.update()
+
+    def progress(self):
+        """ Returns (percent read, words left, seconds left at current
+            speed) or None while book is loading. Time is a difference
+            of delay prefix sums, so it doesn't depend on book size.
+        """
+        if not self.loaded():
+            return None
+
+        words_num = len(self.words)
+        sums = self.words.meta.sums
+        idx = self.currword_idx
+        return (idx * 100 / max(1, words_num), words_num - idx,
+                (sums[words_num] - sums[idx]) * self.word_unit)
+
+    def prerender(self, count):
+        """ Render at most count next frames into frame ring, so showing
+            them is a blit. Pre-rendered frames are keyed by frame index,
+            after rewind frames of other words are just not used.
+        """
+        frames = self.frames
+        frame = frames.find(self.currword_idx) + 1
+        last = min(frame + Draw.FRAMES - 2, frames.ready() - 1)
+        while count and frame <= last:
+            if not self.draw.has_frame(frame):
+                self.draw.render_frame(frame, frames.text(frame),
+                                       frames.focus[frame])
+                count -= 1
+            frame += 1
+
+    def load_frame(self, frame):
+        """ Load words until frame is ready, returns False if book
+            has no such frame.
+        """
+        while frame >= self.frames.ready() and self.loader is not None:
+            self.load_words(Reader.LOAD_BATCH)
+        return frame < self.frames.ready()
 
     def start_reading(self):
-        offset = self.currword_idx
-        last_idx = len(self.words)-1
+        self.scheduler.start()
+        frames = self.frames
+        frame = frames.find(self.currword_idx)
 
-        for i in range(offset, last_idx):
+        while True:
             # when user press pause or exit from reader
             if self.pause or self.cancel:
                 self.pause = False
                 break
+            # reached the end of words loaded so far
+            if frame + 1 >= frames.ready() and not self.load_frame(frame + 1):
+                break
 
-            self.currword_idx += 1
-            self.display_scene()
+            frame += 1
+            self.currword_idx = frames.start(frame)
+            if not self.scheduler.drop_frame(frames.size(frame)):
+                self.display_scene()
+            # render next frames in time left before the deadline
+            self.prerender(Reader.PRERENDER_STEP)
+            self.words.prefetch(self.currword_idx)
 
-            if self.check_punct(self.words[self.currword_idx]):
-                e32.ao_sleep(self.punct_delay)
-            else:
-                e32.ao_sleep(self.word_delay)
+            self.scheduler.wait(frames.delay[frame] * self.word_unit)
 
+        self.real_wpm = self.scheduler.achieved_wpm()
         self.reader_pause()
 
     def close_reader(self):
-        del self.words[:]
+        self.load_timer.cancel()
+        self.loader = None
+        if self.writer is not None:
+            if self.complete:
+                self.writer.finish(self.words)
+            else:
+                self.suspend_index()
+            self.writer = None
+        if self.search_index is not None:
+            self.search_index.close()
+        self.words.clear()
+        self.draw.close()
         appuifw.app.orientation = self.old_orientation
         self.cancel_app()
@@ -0,0 +1,72 @@
+"""
+    Frame scheduler for the reading loop.
+"""
+
+import time
+
+# when late, show next words without sleeping until schedule is reached
+CATCH_UP = "catchup"
+# when late, skip words until schedule is reached
+DROP = "drop"
+
+
+class DeadlineScheduler(object):
+    """ Keeps absolute deadlines for frames instead of sleeping fixed
+        delay after every frame, so time spent on rendering doesn't
+        slow down reading. Late frames are handled by policy (CATCH_UP
+        or DROP). If loop is late more than max_lag seconds (e.g. phone
+        call or clock change), schedule starts again from current time.
+    """
+
+    def __init__(self, sleep, clock=time.time, policy=CATCH_UP, max_lag=0.5):
+        self.sleep = sleep
+        self.clock = clock
+        self.policy = policy
+        self.max_lag = max_lag
+        self.start()
+
+    def start(self):
+        self.start_time = self.deadline = self.clock()
+        self.last_delay = 0
+        self.shown = 0
+        self.dropped = 0
+
+    def drop_frame(self, words=1):
+        """ Check if current frame should be skipped. Counts words
+            of the frame as shown or dropped.
+        """
+        # frame is dropped only if we are late for more than whole frame,
+        # the first frame after start() has no deadline yet
+        if (self.policy == DROP and self.last_delay and
+                self.clock() - self.deadline > self.last_delay):
+            self.dropped += words
+            return True
+
+        self.shown += words
+        return False
+
+    def wait(self, delay):
+        """ Sleep until the end of current frame lasting delay seconds """
+        self.last_delay = delay
+        self.deadline += delay
+        now = self.clock()
+        remaining = self.deadline - now
+
+        if remaining > delay or -remaining > self.max_lag:
+            # clock went backwards or we are hopelessly late
+            self.deadline = now + delay
+            remaining = delay
+
+        if remaining > 0:
+            self.sleep(remaining)
+        else:
+            # let UI process keys even when late
+            self.sleep(0)
+
+    def achieved_wpm(self):
+        """ Words per minute really passed since start() """
+        elapsed = self.clock() - self.start_time
+        words = self.shown + self.dropped
+        if elapsed <= 0 or not words:
+            return 0
+        return int(words * 60. / elapsed + 0.5)
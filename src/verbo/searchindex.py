@@ -0,0 +1,190 @@
+"""
+    Inverted index for searching words in a book.
+
+    Index is built on first search and saved next to the book
+    (book path + SEARCH_EXT), keyed by book size and mtime like the
+    word index.
+
+    File layout (all numbers are little-endian):
+        header    HEADER_FMT: magic, version, book size, book mtime,
+                  terms number, positions number, terms size
+        starts    (terms + 1) uint32 index of first position of term
+        positions uint32 sorted word positions of every term
+        terms     sorted utf-8 terms separated by "\\n"
+"""
+
+import bisect
+import struct
+from array import array
+
+from bookindex import book_key, read_uints, write_uints, mmap
+from wordstore import OFFSET_TYPE
+
+SEARCH_EXT = ".vbs"
+MAGIC = "VBSX"
+VERSION = 1
+HEADER_FMT = "<4sHIIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+UINT_SIZE = 4
+STRIP_MARKS = u".,:;!?-\"'()[]{}<>\u00ab\u00bb\u201c\u201d\u2026\u2014"
+
+
+def normalize(word):
+    return word.strip(STRIP_MARKS).lower()
+
+
+def search_path(book_path):
+    return book_path + SEARCH_EXT
+
+
+def build_index(book_path, words):
+    """ Make inverted index of words and save it. Returns SearchIndex """
+    postings = {}
+    for i in xrange(len(words)):
+        term = normalize(words[i])
+        if term:
+            positions = postings.get(term)
+            if positions is None:
+                positions = postings[term] = array(OFFSET_TYPE)
+            positions.append(i)
+
+    index = SearchIndex()
+    index.terms = postings
+    if not index.save(book_path):
+        # can't be saved (read-only card), use it from memory
+        return index
+
+    index = open_index(book_path) or index
+    return index
+
+
+def open_index(book_path):
+    """ Returns SearchIndex saved for the book or None """
+    index = SearchIndex()
+    try:
+        if index.load(book_path):
+            return index
+    except (EnvironmentError, ValueError, struct.error):
+        pass
+    index.close()
+    return None
+
+
+class SearchIndex(object):
+    """ Maps normalized term to sorted array of its word positions.
+        Loaded index keeps only term table in memory, positions are
+        read from file when they are needed.
+    """
+
+    def __init__(self):
+        # term -> positions array in memory,
+        # or (first, count) in file for loaded index
+        self.terms = {}
+        self.data = None
+        self.index_file = None
+        self.positions_base = 0
+
+    def save(self, book_path):
+        size, mtime = book_key(book_path)
+        terms = self.terms.keys()
+        terms.sort()
+        starts = array(OFFSET_TYPE, [0])
+        for term in terms:
+            starts.append(starts[-1] + len(self.terms[term]))
+        terms_data = u"\n".join(terms).encode("utf-8")
+
+        try:
+            index_file = open(search_path(book_path), "wb")
+        except IOError:
+            return False
+        try:
+            index_file.write(struct.pack(HEADER_FMT, MAGIC, VERSION, size,
+                                         mtime, len(terms), starts[-1],
+                                         len(terms_data)))
+            write_uints(index_file, starts)
+            for term in terms:
+                write_uints(index_file, self.terms[term])
+            index_file.write(terms_data)
+            index_file.close()
+        except EnvironmentError:
+            index_file.close()
+            return False
+        return True
+
+    def load(self, book_path):
+        self.index_file = open(search_path(book_path), "rb")
+        if mmap:
+            self.data = mmap.mmap(self.index_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        else:
+            self.data = self.index_file.read()
+
+        (magic, version, size, mtime, terms_num, positions_num,
+         terms_size) = struct.unpack_from(HEADER_FMT, self.data, 0)
+        if (magic != MAGIC or version != VERSION or
+                (size, mtime) != book_key(book_path)):
+            return False
+
+        starts = read_uints(self.data, HEADER_SIZE, terms_num + 1)
+        self.positions_base = HEADER_SIZE + (terms_num + 1) * UINT_SIZE
+        terms_base = self.positions_base + positions_num * UINT_SIZE
+        if len(self.data) != terms_base + terms_size:
+            return False
+
+        terms = []
+        if terms_num:
+            terms = self.data[terms_base:].decode("utf-8").split(u"\n")
+        self.terms = {}
+        for i in xrange(terms_num):
+            self.terms[terms[i]] = (starts[i], starts[i+1] - starts[i])
+        return True
+
+    def close(self):
+        if mmap and self.data is not None:
+            self.data.close()
+        self.data = None
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+
+    def positions(self, term):
+        """ Sorted positions of normalized term """
+        positions = self.terms.get(term)
+        if positions is None:
+            return array(OFFSET_TYPE)
+        if isinstance(positions, tuple):
+            first, count = positions
+            positions = read_uints(self.data,
+                                   self.positions_base + first * UINT_SIZE,
+                                   count)
+        return positions
+
+    def search(self, query):
+        """ Returns sorted positions of the first word of query phrase """
+        terms = [normalize(w) for w in query.split()]
+        terms = [t for t in terms if t]
+        if not terms:
+            return []
+
+        lists = [self.positions(t) for t in terms]
+        # check candidates from the rarest term against others
+        rarest = 0
+        for k in xrange(len(lists)):
+            if len(lists[k]) < len(lists[rarest]):
+                rarest = k
+
+        hits = []
+        for pos in lists[rarest]:
+            start = pos - rarest
+            if start < 0:
+                continue
+            for k in xrange(len(lists)):
+                if k == rarest:
+                    continue
+                positions = lists[k]
+                i = bisect.bisect_left(positions, start + k)
+                if i == len(positions) or positions[i] != start + k:
+                    break
+            else:
+                hits.append(start)
+        return hits
@@ -1,21 +1,43 @@
 import os
+import re
+import e32
 import appuifw
 
-from filesel import FileSel
+from filesel import FileSel, walk_files
 from window import Application, Dialog
-from libmgr import LibManager
+from libmgr import LibManager, ORDER_TITLE, ORDER_RECENT
 from reader import Reader
+from fb2parser import FB2MetaParser
+import fontmetrics
+import wordmeta
+from xml.parsers import expat
 
 
 class VerboApp(Application):
 
+    # books shown in library list at once
+    PAGE_SIZE = 30
+    # anchored, so .vbi and .vbs sidecars of books are not matched
+    BOOK_MASK = r".*\.(txt|fb2)$"
+    # books added between progress updates during folder import
+    IMPORT_BATCH = 20
+
     def __init__(self, app_dir="C:\\"):
         db_path = os.path.join(app_dir, u"verbo.e32dbm")
+        fontmetrics.CACHE_DIR = app_dir
+        # optional frequency list makes rare words slower
+        common_words = wordmeta.load_common_words(
+            os.path.join(app_dir, u"verbo-freq.txt"))
+        if common_words is not None:
+            wordmeta.TIMING = wordmeta.AdaptiveTiming(common_words)
         appuifw.app.screen = "normal"
 
         self.lib_mgr = LibManager(db_path)
         self.book_list = []
+        self.page = 0
+        self.order = ORDER_TITLE
         self.main_menu = [(u"Import book", self.add_book),
+                            (u"Import folder", self.import_folder),
                             (u"Remove book", self.rm_book),
                             (u"Exit", self.close_app)]
 
@@ -23,18 +45,48 @@ class VerboApp(Application):
         self.update_liblist()
 
     def update_liblist(self):
-        self.book_list = self.lib_mgr.get_books()
+        pages = max(1, (self.lib_mgr.count() + VerboApp.PAGE_SIZE - 1) //
+                       VerboApp.PAGE_SIZE)
+        self.page = min(self.page, pages - 1)
+        self.book_list = self.lib_mgr.get_books(self.page * VerboApp.PAGE_SIZE,
+                                                VerboApp.PAGE_SIZE,
+                                                self.order)
         ob_callback = self.open_book
 
         if not self.book_list:
             self.book_list = [(u"Empty", u"add books by menu")]
             ob_callback = lambda: None
 
-        self.set_ui(u"Verbo / Library",
+        title = u"Verbo / Library"
+        menu = self.main_menu[:-1]
+        if pages > 1:
+            title += u" %d/%d" % (self.page + 1, pages)
+            if self.page < pages - 1:
+                menu.append((u"Next page", lambda: self.change_page(1)))
+            if self.page > 0:
+                menu.append((u"Previous page", lambda: self.change_page(-1)))
+        if self.order == ORDER_TITLE:
+            menu.append((u"Sort by last read",
+                         lambda: self.change_order(ORDER_RECENT)))
+        else:
+            menu.append((u"Sort by title",
+                         lambda: self.change_order(ORDER_TITLE)))
+        menu.append(self.main_menu[-1])
+
+        self.set_ui(title,
                     appuifw.Listbox(self.book_list, ob_callback),
-                    self.main_menu)
+                    menu)
         self.refresh()
 
+    def change_page(self, offset):
+        self.page += offset
+        self.update_liblist()
+
+    def change_order(self, order):
+        self.order = order
+        self.page = 0
+        self.update_liblist()
+
     def open_book(self):
         curr_book = appuifw.app.body.current()
         title = self.book_list[curr_book][0]
@@ -43,25 +95,81 @@ class VerboApp(Application):
 
         def cbk():
             # when closing reader save last position 
-            self.lib_mgr.update_book(path, title, dialog.currword_idx)
-            self.refresh()
+            words = None
+            if dialog.loaded():
+                words = dialog.words_num + 1
+            self.lib_mgr.update_book(path, title, dialog.currword_idx, words)
+            self.lib_mgr.flush()
+            # order by last read has changed
+            self.update_liblist()
             return True
 
         dialog = Reader(cbk, title, path, pos)
         dialog.run()
 
+    def book_info(self, path):
+        """ Returns title and estimated words number of the book.
+            Title of fb2 book is taken from its description,
+            otherwise file name is used.
+        """
+        title = os.path.basename(path)
+        words = 0
+
+        if path.lower().endswith(".fb2"):
+            try:
+                meta = FB2MetaParser(path).parse_meta()
+            except (expat.ExpatError, EnvironmentError):
+                meta = {}
+            if meta.get("title"):
+                title = meta["title"]
+                if meta["author"]:
+                    title = u"%s (%s)" % (title, meta["author"])
+                words = meta["words"]
+
+        return title, words
+
     def add_book(self):
-        dialog = FileSel(mask = r"(.*\.txt|.*\.fb2)")
+        dialog = FileSel(mask = VerboApp.BOOK_MASK)
         path = dialog.run()
 
         if path is not None:
-            title = path.split("\\")[-1]
+            title, words = self.book_info(path)
             #
-            if self.lib_mgr.add_book(title, path):
+            if self.lib_mgr.add_book(title, path, words=words):
                 self.update_liblist()
             else:
                 appuifw.note(u"That book already exists!", "error")
 
+    def import_folder(self):
+        """ Add all books from folder and its subfolders.
+            Library is saved and redrawn once, at the end.
+        """
+        root = FileSel(select_dir = True).run()
+        if root is None:
+            return
+
+        found = 0
+        added = 0
+        self.lock_ui(u"Importing...")
+        self.lib_mgr.begin()
+        try:
+            for path in walk_files(root, re.compile(VerboApp.BOOK_MASK)):
+                found += 1
+                if self.lib_mgr.get_book(path) is None:
+                    title, words = self.book_info(path)
+                    self.lib_mgr.add_book(title, path, words=words)
+                    added += 1
+                if found % VerboApp.IMPORT_BATCH == 0:
+                    appuifw.app.title = u"Importing: %d new of %d" % (added,
+                                                                     found)
+                    e32.ao_yield()
+        finally:
+            self.lib_mgr.commit()
+            self.unlock_ui()
+
+        self.update_liblist()
+        appuifw.note(u"%d books imported" % added, "info")
+
     def rm_book(self):
         curr_book = appuifw.app.body.current()
         # second item in book_list is path
@@ -70,4 +178,5 @@ class VerboApp(Application):
         self.update_liblist()
 
     def close_app(self):
+        self.lib_mgr.close()
         Application.close_app(self)
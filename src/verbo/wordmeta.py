@@ -0,0 +1,192 @@
+"""
+    Per-word display data, computed once when book is loaded.
+"""
+
+import codecs
+import binascii
+from array import array
+
+from wordstore import OFFSET_TYPE, PARA_END, SENT_END
+
+PUNCT_MARKS = (",", ".", "-", ":", "?", "!")
+
+# pause classes
+NO_PAUSE = 0
+PUNCT_PAUSE = 1
+
+# delay multipliers are kept in tenths
+DELAY_UNIT = 10.
+PAUSE_DELAYS = {NO_PAUSE: 10, PUNCT_PAUSE: 20}
+MAX_DELAY = 255
+
+
+def best_letter_pos(word):
+    """ Primitive algorithm for defining focus letter """
+    word_len = len(word)
+    best_letter = 0
+
+    if word_len == 1:
+        best_letter = 0
+    elif word_len >= 2 and word_len <= 5:
+        best_letter = 1
+    elif word_len >= 6 and word_len <= 9:
+        best_letter = 2
+    elif word_len >= 10 and word_len <= 13:
+        best_letter = 3
+    else:
+        best_letter = 4
+
+    return best_letter
+
+
+def check_punct(word):
+    if word[-1] in PUNCT_MARKS:
+        return True
+    return False
+
+
+def checksum(text):
+    return binascii.crc32(text.encode("utf-8")) & 0xffffffff
+
+
+class FixedTiming(object):
+    """ Word delay by pause class only, punctuation doubles it """
+
+    def delay(self, word, pause, flags):
+        return PAUSE_DELAYS[pause]
+
+    def model_id(self):
+        """ Checksum of the model, index made by another one is rebuilt """
+        return checksum(u"fixed %r" % sorted(PAUSE_DELAYS.items()))
+
+
+class AdaptiveTiming(object):
+    """ Word delay by its length, punctuation, sentence and paragraph
+        end. Words missing in the table of common words (if there is
+        one) are rare and get more time. All delays are in 1/DELAY_UNIT
+        of the word delay set by speed.
+    """
+    SHORT_LEN = 3
+    SHORT_DELAY = 8
+    BASE_DELAY = 10
+    # words longer than LONG_LEN get LONG_CHAR_DELAY for every letter
+    LONG_LEN = 7
+    LONG_CHAR_DELAY = 1
+    MAX_LEN_DELAY = 20
+    PUNCT_DELAY = 8
+    SENT_DELAY = 12
+    PARA_DELAY = 20
+    RARE_DELAY = 3
+    STRIP_MARKS = u"".join(PUNCT_MARKS) + u";\"'()\u00ab\u00bb\u2026"
+
+    def __init__(self, common_words=None):
+        self.common_words = common_words
+        self.checksum = None
+
+    def delay(self, word, pause, flags):
+        word_len = len(word) - (pause != NO_PAUSE)
+        if word_len <= self.SHORT_LEN:
+            delay = self.SHORT_DELAY
+        elif word_len <= self.LONG_LEN:
+            delay = self.BASE_DELAY
+        else:
+            delay = min(self.BASE_DELAY + (word_len - self.LONG_LEN) *
+                        self.LONG_CHAR_DELAY, self.MAX_LEN_DELAY)
+
+        if flags & PARA_END:
+            delay += self.PARA_DELAY
+        elif flags & SENT_END:
+            delay += self.SENT_DELAY
+        elif pause != NO_PAUSE:
+            delay += self.PUNCT_DELAY
+
+        if (self.common_words is not None and word_len > self.SHORT_LEN and
+                word.strip(self.STRIP_MARKS).lower()
+                not in self.common_words):
+            delay += self.RARE_DELAY
+
+        return delay
+
+    def model_id(self):
+        if self.checksum is None:
+            params = (self.SHORT_LEN, self.SHORT_DELAY, self.BASE_DELAY,
+                      self.LONG_LEN, self.LONG_CHAR_DELAY,
+                      self.MAX_LEN_DELAY, self.PUNCT_DELAY, self.SENT_DELAY,
+                      self.PARA_DELAY, self.RARE_DELAY, self.STRIP_MARKS)
+            words = list(self.common_words or ())
+            words.sort()
+            self.checksum = checksum(u"adaptive %r\n%s" %
+                                     (params, u"\n".join(words)))
+        return self.checksum
+
+
+def load_common_words(path, limit=5000):
+    """ Read utf-8 frequency list (one word per line, most frequent
+        first), returns set of limit most common words or None.
+    """
+    try:
+        freq_file = codecs.open(path, "r", "utf-8")
+    except IOError:
+        return None
+
+    common_words = set()
+    try:
+        try:
+            for line in freq_file:
+                words = line.split()
+                if words:
+                    common_words.add(words[0].lower())
+                    if len(common_words) >= limit:
+                        break
+        except UnicodeError:
+            # list is not in utf-8
+            return None
+    finally:
+        freq_file.close()
+    return common_words
+
+
+# timing model of new books, set by application
+TIMING = AdaptiveTiming()
+
+
+class WordMeta(object):
+    """ Parallel arrays with focus letter, pause class and delay
+        multiplier (in 1/DELAY_UNIT) of every word, so reading loop
+        does only array lookups. Delays are computed once by timing
+        model, reader scales them by speed. sums[i] is the sum of
+        delays of words before word i, so reading time of any range
+        of words is a difference of two sums.
+    """
+
+    def __init__(self, timing=None):
+        self.timing = timing or TIMING
+        self.focus = array("B")
+        self.pause = array("B")
+        self.delay = array("B")
+        self.sums = array(OFFSET_TYPE, [0])
+
+    def __len__(self):
+        return len(self.focus)
+
+    def update(self, words):
+        """ Compute data for words added since the last update """
+        if self.focus:
+            # flags of the last word could be set after it was added
+            del self.focus[-1]
+            del self.pause[-1]
+            del self.delay[-1]
+            del self.sums[-1]
+
+        delay = self.timing.delay
+        flags = words.flags
+        for idx in xrange(len(self.focus), len(words)):
+            word = words[idx]
+            pause = NO_PAUSE
+            if check_punct(word):
+                pause = PUNCT_PAUSE
+            self.focus.append(best_letter_pos(word))
+            self.pause.append(pause)
+            self.delay.append(max(1, min(delay(word, pause, flags[idx]),
+                                         MAX_DELAY)))
+            self.sums.append(self.sums[-1] + self.delay[-1])
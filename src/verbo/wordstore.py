@@ -0,0 +1,102 @@
+"""
+    Compact storage for the words of a book.
+"""
+
+from array import array
+
+# offsets need at least 32 bits, "I" is enough on most platforms
+OFFSET_TYPE = array("I").itemsize >= 4 and "I" or "L"
+
+# word flags
+PARA_END = 1
+SENT_END = 2
+
+SENT_MARKS = u".?!\u2026"
+# closing quotes and brackets after sentence end mark
+CLOSING_MARKS = u"\"')\u00bb\u201d"
+
+
+def is_sentence_end(word):
+    word = word.rstrip(CLOSING_MARKS)
+    return bool(word) and word[-1] in SENT_MARKS
+
+
+class WordStore(object):
+    """ Keeps all words in one contiguous unicode buffer and an array
+        of offsets into it instead of a list with one string object
+        per word. Supports len(), indexing and iteration like a list.
+        Every word also has a byte of flags (PARA_END, SENT_END).
+        Starts of sentences and paragraphs are collected in sorted
+        arrays while words are added.
+    """
+
+    def __init__(self, words=None):
+        self.clear()
+        if words is not None:
+            self.extend(words)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        words_num = len(self.offsets) - 1
+        if idx < 0:
+            idx += words_num
+        if idx < 0 or idx >= words_num:
+            raise IndexError("word index out of range")
+
+        return self.chars[self.offsets[idx]:self.offsets[idx+1]].tounicode()
+
+    def __iter__(self):
+        for idx in xrange(len(self)):
+            yield self[idx]
+
+    def append(self, word, flags=0):
+        if is_sentence_end(word):
+            flags |= SENT_END
+        self.chars.fromunicode(word)
+        self.offsets.append(len(self.chars))
+        self.flags.append(0)
+        self.mark(flags)
+
+    def extend(self, words):
+        for word in words:
+            self.append(word)
+
+    def mark(self, flags):
+        """ Set flags on the last word """
+        if not self.flags:
+            return
+
+        new_flags = flags & ~self.flags[-1]
+        self.flags[-1] |= flags
+        # next word starts new paragraph (sentence)
+        if new_flags & PARA_END:
+            self.paragraphs.append(len(self.flags))
+        if new_flags & (SENT_END | PARA_END) and \
+                self.sentences[-1] != len(self.flags):
+            self.sentences.append(len(self.flags))
+
+    def prefetch(self, idx, direction=1):
+        """ All words are in memory """
+        pass
+
+    def clear(self):
+        # ChapterIndex, set by parser
+        self.chapters = None
+        # WordMeta and ChunkIndex, set by reader
+        self.meta = None
+        self.chunks = None
+        self.chars = array("u")
+        self.offsets = array(OFFSET_TYPE, [0])
+        self.flags = array("B")
+        self.sentences = array(OFFSET_TYPE, [0])
+        self.paragraphs = array(OFFSET_TYPE, [0])
+
+    def memory_size(self):
+        """ Approximate size of the buffers in bytes """
+        return (len(self.chars) * self.chars.itemsize +
+                len(self.offsets) * self.offsets.itemsize +
+                len(self.flags) +
+                (len(self.sentences) + len(self.paragraphs)) *
+                self.sentences.itemsize)
@@ -0,0 +1,262 @@
+"""
+    Tests of book index, library records and indexes and chunks.
+    Run under desktop Python 2 with headless backend:
+
+        python tests/test_indexes.py
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from verbo import backend
+backend.use(backend.HEADLESS)
+
+import e32dbm
+
+from verbo import bookindex
+from verbo.bookindex import BookIndex, IndexWriter, PAGE_WORDS
+from verbo.wordstore import WordStore, PARA_END
+from verbo.wordmeta import WordMeta
+from verbo.chunks import ChunkIndex
+from verbo.libmgr import LibManager, BookRecord, SortedIndex
+
+VOCABULARY = (u"the of a in reading attention perception remarkable "
+              u"end. why? yes! so, \u0441\u043b\u043e\u0432\u043e "
+              u"\u043a\u043d\u0438\u0433\u0430.").split()
+
+
+def make_words(words_num, seed=0):
+    """ WordStore with meta and chunks, every 37th word ends paragraph """
+    rnd = random.Random(seed)
+    words = WordStore()
+    words.meta = WordMeta()
+    words.chunks = ChunkIndex()
+    for i in xrange(words_num):
+        words.append(rnd.choice(VOCABULARY))
+        if i % 37 == 36:
+            words.mark(PARA_END)
+    words.meta.update(words)
+    words.chunks.update(words, True)
+    return words
+
+
+class BookIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.book_path = os.path.join(self.dir, "book.txt")
+        open(self.book_path, "wb").write("book")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_index(self, words, written=0):
+        """ Write index like reader does, blocks of the first written
+            words while book is loaded, the rest by finish()
+        """
+        writer = IndexWriter(self.book_path)
+        self.assertTrue(writer.write_words(words, written))
+        self.assertTrue(writer.finish(words))
+
+    def check_index(self, words, paged):
+        index = bookindex.open_index(self.book_path)
+        self.assertTrue(index is not None)
+        index.close()
+        index = BookIndex(self.book_path, paged)
+        words_num = len(words)
+        self.assertEqual(len(index), words_num)
+        self.assertEqual(list(index), list(words))
+        for name in ("focus", "pause", "delay", "sums"):
+            column = getattr(words.meta, name)
+            self.assertEqual([getattr(index.meta, name)[i]
+                              for i in xrange(len(column))], list(column))
+        self.assertEqual([index.flags[i] for i in xrange(words_num)],
+                         list(words.flags))
+        for name in ("sentences", "paragraphs"):
+            table = getattr(index, name)
+            self.assertEqual([table[i] for i in xrange(len(table))],
+                             list(getattr(words, name)))
+        for name in ("starts", "focus", "delay"):
+            table = getattr(index.chunks, name)
+            self.assertEqual([table[i] for i in xrange(len(table))],
+                             list(getattr(words.chunks, name)))
+        self.assertEqual(index[-1], words[-1])
+        self.assertRaises(IndexError, lambda: index[words_num])
+        index.close()
+
+    def test_page_boundaries(self):
+        for words_num in (1, PAGE_WORDS, 2 * PAGE_WORDS):
+            words = make_words(words_num, words_num)
+            for written in (0, words_num - 1):
+                self.write_index(words, written)
+                self.check_index(words, False)
+                self.check_index(words, True)
+
+    def test_paged_window(self):
+        words = make_words((bookindex.MAX_PAGES + 2) * PAGE_WORDS + 7)
+        self.write_index(words)
+        index = BookIndex(self.book_path, True)
+        for idx in xrange(0, len(words), 97):
+            self.assertEqual(index[idx], words[idx])
+        self.assertTrue(len(index.pages) <= bookindex.MAX_PAGES)
+        index.close()
+        index = BookIndex(self.book_path, True)
+        for num in xrange(bookindex.MAX_PAGES):
+            index[num * PAGE_WORDS]
+        # page 0 was used recently, least recently used page 1 is dropped
+        index[0]
+        index[bookindex.MAX_PAGES * PAGE_WORDS]
+        self.assertTrue(0 in index.pages)
+        self.assertFalse(1 in index.pages)
+        index.close()
+
+    def test_invalid_for_changed_book(self):
+        self.write_index(make_words(10))
+        open(self.book_path, "ab").write("more")
+        self.assertTrue(bookindex.open_index(self.book_path) is None)
+
+
+class BookRecordTest(unittest.TestCase):
+
+    def test_old_record(self):
+        data = u"Title, with, commas,42"
+        self.assertTrue(BookRecord.is_old(data))
+        record = BookRecord.decode(data)
+        self.assertEqual(record.title, u"Title, with, commas")
+        self.assertEqual(record.pos, 42)
+
+    def test_record(self):
+        record = BookRecord(u"Title, 7", 42, 1000, 5, 6, 7, 1)
+        data = record.encode()
+        self.assertFalse(BookRecord.is_old(data))
+        decoded = BookRecord.decode(data)
+        for name in ("title", "pos", "words", "size", "mtime", "opened",
+                     "book_format"):
+            self.assertEqual(getattr(decoded, name), getattr(record, name))
+
+    def test_migrate(self):
+        db_path = u"test-migrate.e32dbm"
+        db = e32dbm.open(db_path, "n")
+        db[u"E:\\books\\b.fb2"] = u"B, part 2,42"
+        db[u"E:\\books\\a.txt"] = u"A,7"
+        db.close()
+
+        lib = LibManager(db_path)
+        self.assertEqual(lib.get_books(), [(u"A", u"E:\\books\\a.txt"),
+                                           (u"B, part 2",
+                                            u"E:\\books\\b.fb2")])
+        record = lib.get_book(u"E:\\books\\b.fb2")
+        self.assertEqual(record.pos, 42)
+        self.assertEqual(record.book_format, BookRecord.FORMATS["fb2"])
+        lib.close()
+
+
+class SortedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SortedIndex(u"test", lambda record: record.title)
+        self.books = {}
+
+    def add(self, num):
+        path = u"E:\\%d.txt" % num
+        record = BookRecord(u"%05d" % (num * 7919 % 1000))
+        self.index.add(path, record)
+        self.books[path] = record
+
+    def sorted_paths(self):
+        items = [(record.title, path) for path, record in self.books.items()]
+        items.sort()
+        return [path for title, path in items]
+
+    def test_split(self):
+        for num in xrange(5 * SortedIndex.MAX_PAGE):
+            self.add(num)
+        self.assertTrue(len(self.index.pages) > 1)
+        for keys, paths in self.index.pages:
+            self.assertTrue(len(keys) <= SortedIndex.MAX_PAGE)
+        self.assertEqual(len(self.index), len(self.books))
+        self.assertEqual(self.index.window(), self.sorted_paths())
+
+    def test_remove(self):
+        for num in xrange(3 * SortedIndex.MAX_PAGE):
+            self.add(num)
+        pages = len(self.index.pages)
+        paths = self.sorted_paths()
+        # the first pages become empty and are removed
+        for path in paths[:len(paths) // 2]:
+            self.index.remove(path, self.books.pop(path))
+        self.assertEqual(self.index.window(), self.sorted_paths())
+        self.assertTrue(len(self.index.pages) < pages)
+        for path in self.sorted_paths():
+            self.index.remove(path, self.books.pop(path))
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.window(), [])
+
+    def test_load(self):
+        data = {}
+        for num in xrange(3 * SortedIndex.MAX_PAGE):
+            self.add(num)
+            if num % 50 == 0:
+                data.update(self.index.dump())
+        for path in self.sorted_paths()[::3]:
+            self.index.remove(path, self.books.pop(path))
+        data.update(self.index.dump())
+        loaded = SortedIndex(u"test", lambda record: record.title)
+        loaded.load(lambda key: data.get(key))
+        self.assertEqual(len(loaded), len(self.books))
+        self.assertEqual(loaded.window(), self.sorted_paths())
+
+    def test_window(self):
+        for num in xrange(2 * SortedIndex.MAX_PAGE + 5):
+            self.add(num)
+        paths = self.sorted_paths()
+        for offset in (0, 1, SortedIndex.MAX_PAGE - 1, len(paths) - 3,
+                       len(paths) + 1):
+            self.assertEqual(self.index.window(offset, 30),
+                             paths[offset:offset + 30])
+            reverse = paths[:]
+            reverse.reverse()
+            self.assertEqual(self.index.window(offset, 30, True),
+                             reverse[offset:offset + 30])
+
+
+class ChunkIndexTest(unittest.TestCase):
+
+    def test_incremental(self):
+        whole = make_words(3000, 1)
+        # tokens like loader yields them, paragraph end is set
+        # on the last word by the next token
+        tokens = []
+        for idx in xrange(len(whole)):
+            tokens.append((whole[idx], 0))
+            if whole.flags[idx] & PARA_END:
+                tokens.append((None, PARA_END))
+        rnd = random.Random(1)
+        words = WordStore()
+        words.meta = WordMeta()
+        words.chunks = ChunkIndex()
+        # words are added by batches like reader loads them
+        while tokens:
+            batch = rnd.randint(0, 50)
+            for word, flags in tokens[:batch]:
+                if word is None:
+                    words.mark(flags)
+                else:
+                    words.append(word, flags)
+            del tokens[:batch]
+            words.meta.update(words)
+            words.chunks.update(words, not tokens)
+        for name in ("starts", "focus", "delay"):
+            self.assertEqual(list(getattr(words.chunks, name)),
+                             list(getattr(whole.chunks, name)))
+        self.assertEqual(words.chunks.ready(), len(whole.chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()